@@ -0,0 +1,66 @@
+'''
+Requests per second to a local stand-in cache server, with the pooled
+keep-alive session of utils/download.py against a new connection per
+request, as the baseline download did.
+
+    python -m benchmarks.download_pool [--requests 2000] [--threads 1 4 8]
+'''
+import argparse
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import cbor
+import requests
+
+import utils.download
+from utils.response import Response
+from tests.cache_server import FakeCacheServer, make_site
+
+
+def unpooled_download(url, config):
+    '''The baseline download: a connection of its own for every request.'''
+    host, port = config.cache_server
+    resp = requests.get(
+        f"http://{host}:{port}/",
+        params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
+    return Response(cbor.loads(resp.content))
+
+
+def run(download, urls, config, threads):
+    '''Requests per second downloading every url on threads threads.'''
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        for resp in executor.map(lambda url: download(url, config), urls):
+            assert resp.status == 200
+    return len(urls) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    pages = make_site(hosts=10, pages_per_host=args.requests // 10)
+    urls = list(pages)
+    with FakeCacheServer(pages) as server:
+        for threads in args.threads:
+            config = SimpleNamespace(
+                cache_server=server.address, user_agent="benchmark", timeout=30,
+                retries=0, backoff=0.0, pool_size=threads, max_size=15_000_000)
+            utils.download._session = None
+            server.connections = 0
+            pooled = run(utils.download.download, urls, config, threads)
+            pooled_connections = server.connections
+            server.connections = 0
+            unpooled = run(unpooled_download, urls, config, threads)
+            print(
+                f"{threads:>2} threads: pooled {pooled:>7.0f} requests/s "
+                f"({pooled_connections} connections), unpooled {unpooled:>7.0f} "
+                f"requests/s ({server.connections} connections), {pooled / unpooled:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
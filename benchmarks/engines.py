@@ -0,0 +1,77 @@
+'''
+Pages per second crawling a synthetic site from a local stand-in cache
+server that takes latency seconds to answer, with the thread engine's
+Workers against the asyncio engine's AsyncWorker.
+
+    python -m benchmarks.engines [--hosts 50] [--pages 20] [--latency 0.05]
+        [--threads 1 8 50] [--concurrency 50 200]
+'''
+import argparse
+import tempfile
+import time
+
+from types import SimpleNamespace
+
+import scraper
+import utils.download
+from crawler import Crawler
+from crawler.async_worker import AsyncWorker
+from crawler.worker import Worker
+from report import Report
+from utils.simhash import Simhash
+from utils.traps import TrapDetector
+from tests.cache_server import FakeCacheServer, make_site
+
+
+def crawl(server, seeds, directory, engine, threads, concurrency, delay):
+    '''(pages/s, pages) crawling seeds from server, without sitemaps.'''
+    config = SimpleNamespace(
+        user_agent="benchmark", threads_count=threads, engine=engine,
+        concurrency=concurrency, parsers=4, parse_processes=0, parse_queue=0,
+        save_file=f"{directory}/frontier.sqlite", commit_batch=1000,
+        commit_interval=1.0, report_interval=60, report_words=0,
+        metrics_interval=0, metrics_port=0, pool_size=threads, timeout=30,
+        retries=0, backoff=0.0, seed_urls=seeds, time_delay=delay,
+        max_size=15_000_000, robots_ttl=24 * 60 * 60, sitemaps=False,
+        host_budget=0, host_window=0, skip_near_duplicates=False,
+        cache_server=server.address)
+    # every run crawls the site afresh.
+    scraper.report, scraper.simhash, scraper.traps = Report(), Simhash(), TrapDetector()
+    utils.download._session = None
+    server.requests.clear()
+    worker_factory = AsyncWorker if engine == "asyncio" else Worker
+    crawler = Crawler(config, restart=True, worker_factory=worker_factory)
+    start = time.perf_counter()
+    crawler.start()
+    elapsed = time.perf_counter() - start
+    pages = sum(1 for url, _ in server.requests if not url.endswith("/robots.txt"))
+    return pages / elapsed, pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--hosts", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=20, help="pages per host")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--delay", type=float, default=0.0, help="POLITENESS")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 50])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 200])
+    args = parser.parse_args()
+
+    pages = make_site(args.hosts, args.pages)
+    seeds = [f"http://h{host}.ics.uci.edu/page/0" for host in range(args.hosts)]
+    with FakeCacheServer(pages, latency=args.latency) as server:
+        for threads in args.threads:
+            with tempfile.TemporaryDirectory() as directory:
+                rate, crawled = crawl(
+                    server, seeds, directory, "threads", threads, 1, args.delay)
+            print(f"threads, {threads:>3} workers:       {rate:>7.1f} pages/s ({crawled} pages)")
+        for concurrency in args.concurrency:
+            with tempfile.TemporaryDirectory() as directory:
+                rate, crawled = crawl(
+                    server, seeds, directory, "asyncio", 1, concurrency, args.delay)
+            print(f"asyncio, {concurrency:>3} concurrent:  {rate:>7.1f} pages/s ({crawled} pages)")
+
+
+if __name__ == "__main__":
+    main()
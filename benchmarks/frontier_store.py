@@ -0,0 +1,86 @@
+'''
+Urls per second saved to the frontier's FrontierStore, with its group
+commits, against the shelve the baseline frontier synced after every write.
+Every url is added, then marked completed, as in a crawl.
+
+    python -m benchmarks.frontier_store [--urls 1000000] [--shelve-urls 5000]
+
+The shelve falls back to dbm.dumb where no other dbm is installed, which
+rewrites its whole index on every sync, so it gets fewer urls by default.
+'''
+import argparse
+import dbm
+import os
+import shelve
+import tempfile
+import time
+
+from hashlib import sha256
+
+from crawler.store import FrontierStore
+
+
+def make_urls(count):
+    '''(urlhash, url) of count urls over 100 hosts.'''
+    urls = [f"http://h{i % 100}.ics.uci.edu/page/{i}" for i in range(count)]
+    return [(sha256(url.encode()).hexdigest(), url) for url in urls]
+
+
+def run_store(path, urls, batch_size, interval):
+    '''(urls/s, commits) writing urls to a FrontierStore the way the Frontier does.'''
+    store = FrontierStore(path, batch_size=batch_size, interval=interval)
+    start = time.perf_counter()
+    for urlhash, url in urls:
+        if urlhash not in store:
+            store[urlhash] = (url, False, 0)
+    for urlhash, url in urls:
+        store[urlhash] = (url, True, 0)
+    store.close()
+    return len(urls) / (time.perf_counter() - start), store.commits
+
+
+def run_shelve(path, urls):
+    '''(urls/s, syncs) writing urls to a shelve the way the baseline frontier did.'''
+    save = shelve.open(path)
+    syncs = 0
+    start = time.perf_counter()
+    for urlhash, url in urls:
+        if urlhash not in save:
+            save[urlhash] = (url, False)
+            save.sync()
+            syncs += 1
+    for urlhash, url in urls:
+        save[urlhash] = (url, True)
+        save.sync()
+        syncs += 1
+    save.close()
+    return len(urls) / (time.perf_counter() - start), syncs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--urls", type=int, default=1_000_000)
+    parser.add_argument("--shelve-urls", type=int, default=5_000)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        urls = make_urls(args.urls)
+        rate, commits = run_store(
+            os.path.join(directory, "frontier.sqlite"), urls, args.batch, args.interval)
+        seconds = len(urls) / rate
+        print(
+            f"FrontierStore: {len(urls)} urls, {rate:>9.0f} urls/s, {commits} commits "
+            f"({commits / seconds:.1f} fsyncs/s, one per WAL commit)")
+        path = os.path.join(directory, "frontier.shelve")
+        urls = urls[:args.shelve_urls]
+        rate, syncs = run_shelve(path, urls)
+        seconds = len(urls) / rate
+        print(
+            f"shelve ({dbm.whichdb(path)}): {len(urls)} urls, {rate:>9.0f} urls/s, "
+            f"{syncs} syncs ({syncs / seconds:.1f}/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+'''
+Pages per second and peak RSS parsing pages into text and links with
+utils/page.py's single lxml parse, against the baseline scraper's
+BeautifulSoup html.parser for the text plus lxml's iterlinks for the
+links, each in a process of its own. Pages come from a corpus recorded
+with launch.py --record, or are synthetic ics.uci.edu-like pages.
+
+    python -m benchmarks.page_parse [--corpus CORPUS] [--pages 500]
+'''
+import argparse
+import gc
+import multiprocessing
+import random
+import sqlite3
+import time
+import zlib
+
+from bs4 import BeautifulSoup
+from lxml import html
+
+from utils.download import decode_response
+from utils.page import parse_page
+
+
+def baseline_parse(url, content):
+    '''The baseline scraper's two parses, without its prints.'''
+    text = BeautifulSoup(content, "html.parser").get_text()
+    links = [link[2] for link in html.iterlinks(content)]
+    return text, links
+
+
+def lxml_parse(url, content):
+    page = parse_page(url, content)
+    return page.text, page.links
+
+
+PARSERS = {"baseline": baseline_parse, "lxml": lxml_parse}
+
+
+def load_corpus(path, count):
+    '''(url, html bytes) of up to count pages answered with a 200 in the corpus at path.'''
+    db = sqlite3.connect(path)
+    pages = list()
+    for url, compressed in db.execute(
+            "SELECT url, body FROM responses WHERE status = 200 AND body IS NOT NULL"):
+        resp = decode_response(url, 200, zlib.decompress(compressed))
+        if resp.status == 200 and resp.raw_response is not None and resp.raw_response.content:
+            pages.append((url, resp.raw_response.content))
+            if len(pages) == count:
+                break
+    db.close()
+    return pages
+
+
+def make_pages(count, seed=0):
+    '''(url, html bytes) of count pages laid out like a department site's.'''
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(3000)]
+    pages = list()
+    for i in range(count):
+        url = f"https://www.ics.uci.edu/page/{i}"
+        nav = "".join(
+            f'<li><a href="/section/{j}/">Section {j}</a></li>' for j in range(40))
+        paragraphs = "".join(
+            "<p>" + " ".join(rng.choice(words) for _ in range(rng.randrange(20, 120)))
+            + f' <a href="../page/{rng.randrange(count)}#top">more</a></p>'
+            for _ in range(rng.randrange(20, 80)))
+        pages.append((url, (
+            f"<!DOCTYPE html><html><head><title>Page {i}</title>"
+            f"<style>{'.c { color: red } ' * 200}</style>"
+            f"<script>{'var x = 1; ' * 300}</script></head>"
+            f"<body><nav><ul>{nav}</ul></nav><main>{paragraphs}</main>"
+            f"<!-- generated --><footer>UCI</footer></body></html>").encode()))
+    return pages
+
+
+def memory(field):
+    '''field of /proc/self/status, VmRSS or VmHWM (peak RSS), in MiB.'''
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) / 1024
+
+
+def run(name, pages, results):
+    '''
+    Puts (pages/s, peak RSS, peak RSS over the RSS parsing started from) of
+    parsing every page with PARSERS[name] on results, RSS in MiB.
+    '''
+    parse = PARSERS[name]
+    gc.collect()
+    # the peak so far is from receiving the pages, start over from here (linux only).
+    with open("/proc/self/clear_refs", "w") as clear_refs:
+        clear_refs.write("5")
+    before = memory("VmRSS")
+    start = time.perf_counter()
+    for url, content in pages:
+        parse(url, content)
+    rate = len(pages) / (time.perf_counter() - start)
+    peak = memory("VmHWM")
+    results.put((rate, peak, peak - before))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--corpus", default=None)
+    parser.add_argument("--pages", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.corpus:
+        pages = load_corpus(args.corpus, args.pages)
+    else:
+        pages = make_pages(args.pages)
+    size = sum(len(content) for _, content in pages) / len(pages) / 1024
+    print(f"{len(pages)} pages of {size:.0f} KiB on average")
+    context = multiprocessing.get_context("spawn")
+    measured = dict()
+    for name in PARSERS:
+        results = context.Queue()
+        process = context.Process(target=run, args=(name, pages, results))
+        process.start()
+        measured[name] = results.get()
+        process.join()
+        rate, rss, added = measured[name]
+        print(
+            f"{name:>8}: {rate:>7.1f} pages/s, peak RSS {rss:>6.1f} MiB, "
+            f"{added:>5.1f} MiB over the pages and imports")
+    print(f"lxml is {measured['lxml'][0] / measured['baseline'][0]:.1f}x as fast")
+
+
+if __name__ == "__main__":
+    main()
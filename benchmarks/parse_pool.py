@@ -0,0 +1,67 @@
+'''
+Pages per second analyzed by fetch threads handing pages to a ParsePool of
+1, 2, 4 and 8 processes, against the threads analyzing them themselves, as
+with PARSEPROCESSES = 0. It only scales with the cpus the machine has.
+
+    python -m benchmarks.parse_pool [--pages 2000] [--words 2000] [--threads 8]
+        [--processes 1 2 4 8]
+'''
+import argparse
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import scraper
+from crawler.parse_pool import ParsePool
+from report import Report
+from utils.simhash import Simhash
+from utils.traps import TrapDetector
+from tests.cache_server import make_site
+
+
+def make_responses(pages, words):
+    '''Responses as the workers get them, of a synthetic site of pages pages.'''
+    site = make_site(hosts=10, pages_per_host=pages // 10, words_per_page=words)
+    return [
+        SimpleNamespace(
+            url=url, status=200, raw_response=SimpleNamespace(content=content))
+        for url, content in site.items()]
+
+
+def run(scrape, responses, threads):
+    '''Pages per second scraping every response on threads threads.'''
+    # every run scrapes the pages afresh.
+    scraper.report, scraper.simhash, scraper.traps = Report(), Simhash(), TrapDetector()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        for _ in executor.map(lambda resp: scrape(resp.url, resp), responses):
+            pass
+    return len(responses) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=2000, help="words per page")
+    parser.add_argument("--threads", type=int, default=8, help="fetch threads")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    responses = make_responses(args.pages, args.words)
+    print(f"{os.cpu_count()} cpus, {len(responses)} pages of {args.words} words")
+    baseline = run(scraper.scraper, responses, args.threads)
+    print(f"in the threads: {baseline:>7.1f} pages/s")
+    for processes in args.processes:
+        pool = ParsePool(processes, max_in_flight=2 * processes)
+        # the processes are spawned, and import the scraper, on first use.
+        for _ in range(processes):
+            pool.executor.submit(scraper.analyze, "http://warm.up/", b"<p>warm</p>").result()
+        rate = run(pool.scrape, responses, args.threads)
+        pool.shutdown()
+        print(f"{processes} processes:    {rate:>7.1f} pages/s, {rate / baseline:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+'''
+Seconds to read back what the Frontier needs from its save file to resume a
+crawl, with the per host counts and the to_be_downloaded index of
+FrontierStore against the full table scans of the queries they replaced.
+
+    python -m benchmarks.resume [--urls 100000 1000000 5000000] [--pending 0.05]
+'''
+import argparse
+import os
+import tempfile
+import time
+
+from hashlib import sha256
+
+from crawler.store import FrontierStore, COMPLETED, SPILLED, TO_BE_DOWNLOADED
+
+
+def make_store(path, count, pending, hosts=1000):
+    '''A store of count urls over hosts hosts, a pending share of them still to be downloaded.'''
+    store = FrontierStore(path, interval=0)
+    every = round(1 / pending)
+    rows = (
+        (sha256(url.encode()).hexdigest(), url, f"h{i % hosts}.ics.uci.edu",
+         TO_BE_DOWNLOADED if i % every == 0 else COMPLETED, 1, 0.0)
+        for i, url in ((i, f"http://h{i % hosts}.ics.uci.edu/page/{i}") for i in range(count)))
+    store.db.execute("BEGIN")
+    store.db.executemany("INSERT INTO urls VALUES (?, ?, ?, ?, ?, ?)", rows)
+    store.db.execute("COMMIT")
+    store.close()
+
+
+def resume(path):
+    '''(seconds, pending urls) reading the store the way Frontier._parse_save_file does.'''
+    start = time.perf_counter()
+    store = FrontierStore(path, interval=0)
+    len(store)
+    store.completed_per_host()
+    store.spilled_per_host()
+    pending = sum(1 for _ in store.to_be_downloaded())
+    store.close()
+    return time.perf_counter() - start, pending
+
+
+def resume_scanning(path):
+    '''Same as resume, with the queries used before the counts were kept.'''
+    start = time.perf_counter()
+    store = FrontierStore(path, interval=0)
+    store.db.execute("SELECT COUNT(*) FROM urls").fetchone()
+    for state in (COMPLETED, SPILLED):
+        store.db.execute(
+            "SELECT netloc, COUNT(*) FROM urls WHERE state = ? GROUP BY netloc",
+            (state,)).fetchall()
+    pending = sum(1 for _ in store._scan("netloc, url, depth", "state = ?", (TO_BE_DOWNLOADED,)))
+    store.close()
+    return time.perf_counter() - start, pending
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--urls", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument("--pending", type=float, default=0.05)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for count in args.urls:
+            path = os.path.join(directory, f"frontier{count}.sqlite")
+            make_store(path, count, args.pending)
+            indexed, pending = resume(path)
+            scanning, scanned = resume_scanning(path)
+            assert pending == scanned
+            print(
+                f"{count:>8} urls, {pending} pending: indexed {indexed:>6.2f}s, "
+                f"scanning {scanning:>6.2f}s, {scanning / indexed:.1f}x")
+            FrontierStore.remove(path)
+
+
+if __name__ == "__main__":
+    main()
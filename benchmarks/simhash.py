@@ -0,0 +1,63 @@
+'''
+Tokens per second fingerprinted by utils/simhash.py, a page at a time and
+many pages at once, against the baseline Simhash._compute_fingerprint,
+which built a bin() string of hash(token) and walked it bit by bit.
+
+    python -m benchmarks.simhash [--pages 200] [--tokens 5000] [--vocabulary 100000]
+'''
+import argparse
+import random
+import time
+
+from utils.simhash import NUM_BITS, compute_fingerprint, compute_fingerprints
+
+
+def baseline_fingerprint(freqs):
+    '''Simhash._compute_fingerprint before utils/simhash.py used a stable hash.'''
+    int_vector = [0] * NUM_BITS
+    for token, freq in freqs.items():
+        # add the current token's weight to the vector
+        hash_val = hash(token)
+        bin_str = bin(hash_val)[2:]
+        for i, bit in enumerate(reversed(bin_str)):
+            weight = freq if bit == '1' else -freq
+            int_vector[NUM_BITS-1-i] += weight
+
+    # convert the vector with sum of weights to a binary fingerprint
+    fingerprint_vector = ['1' if val > 0 else '0' for val in int_vector]
+    return int(''.join(fingerprint_vector), 2)
+
+
+def make_pages(count, tokens, vocabulary, seed=0):
+    '''Word frequencies of count pages of tokens distinct words each.'''
+    rng = random.Random(seed)
+    return [
+        {f"word{rng.randrange(vocabulary)}": rng.randrange(1, 50) for _ in range(tokens)}
+        for _ in range(count)]
+
+
+def timed(fingerprint, pages):
+    '''Tokens per second fingerprinting pages.'''
+    start = time.perf_counter()
+    fingerprint(pages)
+    return sum(map(len, pages)) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--tokens", type=int, default=5000, help="distinct tokens per page")
+    parser.add_argument("--vocabulary", type=int, default=100_000)
+    args = parser.parse_args()
+
+    pages = make_pages(args.pages, args.tokens, args.vocabulary)
+    baseline = timed(lambda pages: [baseline_fingerprint(freqs) for freqs in pages], pages)
+    print(f"baseline:             {baseline:>10.0f} tokens/s")
+    one = timed(lambda pages: [compute_fingerprint(freqs) for freqs in pages], pages)
+    print(f"compute_fingerprint:  {one:>10.0f} tokens/s, {one / baseline:.1f}x")
+    batch = timed(compute_fingerprints, pages)
+    print(f"compute_fingerprints: {batch:>10.0f} tokens/s, {batch / baseline:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
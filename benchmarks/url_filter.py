@@ -0,0 +1,96 @@
+'''
+Links per second checked by utils/url_filter.py, one at a time and a page's
+links at a time, against the baseline scraper.is_valid it replaced, over a
+synthetic corpus mixing the kinds of links found on ics.uci.edu pages.
+The baseline only checks schemes, domains and extensions, the filter also
+rejects calendars, repeated path segments and session queries.
+
+    python -m benchmarks.url_filter [--links 1000000] [--page 50]
+'''
+import argparse
+import random
+import re
+import time
+
+from urllib.parse import urlparse
+
+from utils import url_filter
+
+
+def baseline_is_valid(url):
+    '''scraper.is_valid before utils/url_filter.py.'''
+    parsed = urlparse(url)
+    if parsed.scheme not in set(["http", "https"]):
+        return False
+    elif not parsed.netloc.endswith((".ics.uci.edu",
+                                     ".cs.uci.edu",
+                                     ".informatics.uci.edu",
+                                     ".stat.uci.edu")):
+        return False
+    return not re.match(
+        r".*\.(css|js|bmp|gif|jpe?g|ico"
+        + r"|png|tiff?|mid|mp2|mp3|mp4"
+        + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
+        + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
+        + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
+        + r"|epub|dll|cnf|tgz|sha1"
+        + r"|thmx|mso|arff|rtf|jar|csv"
+        + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower())
+
+
+def make_links(count, seed=0):
+    '''count links, mostly crawlable pages, with assets, other sites and traps among them.'''
+    rng = random.Random(seed)
+    hosts = ["www.ics.uci.edu", "www.cs.uci.edu", "www.informatics.uci.edu",
+             "www.stat.uci.edu", "vision.ics.uci.edu", "wics.ics.uci.edu"]
+    words = ["research", "people", "faculty", "courses", "about", "news", "projects",
+             "publications", "seminar", "undergraduate", "graduate", "events", "~eppstein"]
+    kinds = [
+        (60, lambda host, path: f"https://{host}/{path}/"),
+        (10, lambda host, path: f"https://{host}/{path}/index.php?id={rng.randrange(1000)}"),
+        (8, lambda host, path: f"https://{host}/{path}/file.{rng.choice(['pdf', 'jpg', 'png', 'css', 'js', 'zip'])}"),
+        (8, lambda host, path: f"https://{rng.choice(['www.uci.edu', 'github.com', 'twitter.com'])}/{path}"),
+        (4, lambda host, path: f"mailto:someone@{host}"),
+        (4, lambda host, path: f"https://{host}/events/calendar/{rng.randrange(2000, 2030)}-{rng.randrange(1, 13):02d}-01/"),
+        (3, lambda host, path: f"https://{host}/{path}/{path}/{path}/{path}/"),
+        (3, lambda host, path: f"https://{host}/{path}/?sessionid={rng.getrandbits(64):x}"),
+    ]
+    makers = [make for weight, make in kinds for _ in range(weight)]
+    links = list()
+    for _ in range(count):
+        path = "/".join(rng.choice(words) for _ in range(rng.randrange(1, 4)))
+        links.append(rng.choice(makers)(rng.choice(hosts), path))
+    return links
+
+
+def timed(check, links):
+    '''(links/s, links kept) running check over links.'''
+    start = time.perf_counter()
+    kept = check(links)
+    return len(links) / (time.perf_counter() - start), kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--links", type=int, default=1_000_000)
+    parser.add_argument("--page", type=int, default=50, help="links per page")
+    args = parser.parse_args()
+
+    links = make_links(args.links)
+    pages = [links[i:i + args.page] for i in range(0, len(links), args.page)]
+    baseline, baseline_kept = timed(
+        lambda links: sum(map(baseline_is_valid, links)), links)
+    print(f"baseline is_valid:      {baseline:>9.0f} links/s, {baseline_kept} kept")
+    one, kept = timed(lambda links: sum(map(url_filter.is_valid, links)), links)
+    print(f"url_filter.is_valid:    {one:>9.0f} links/s, {kept} kept, {one / baseline:.2f}x")
+    before = url_filter.rejection_counts()
+    batch, kept = timed(
+        lambda links: sum(len(url_filter.filter_urls(page)) for page in pages), links)
+    print(f"url_filter.filter_urls: {batch:>9.0f} links/s, {kept} kept, {batch / baseline:.2f}x")
+    print("rejected by rule:", {
+        rule: count - before.get(rule, 0)
+        for rule, count in url_filter.rejection_counts().items()})
+
+
+if __name__ == "__main__":
+    main()
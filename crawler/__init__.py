@@ -1,16 +1,61 @@
-from utils import get_logger
+import os
+
+from utils import get_logger, url_filter
+from utils.metrics import metrics, MetricsReporter
 from crawler.frontier import Frontier
 from crawler.worker import Worker
+from crawler.parse_pool import start_parse_pool, stop_parse_pool
+import scraper
 
 class Crawler(object):
     def __init__(self, config, restart, frontier_factory=Frontier, worker_factory=Worker):
         self.config = config
         self.logger = get_logger("CRAWLER")
         self.frontier = frontier_factory(config, restart)
+        scraper.skip_near_duplicates = config.skip_near_duplicates
+        # page fingerprints are saved next to the frontier's save file.
+        self.simhash_file = f"{config.save_file}.simhash"
+        if self._resumes_from(self.simhash_file):
+            scraper.simhash.load(self.simhash_file)
+            self.logger.info(
+                f"Loaded {len(scraper.simhash)} page fingerprints from {self.simhash_file}.")
+        # so are the trap detector's counters,
+        self.traps_file = f"{config.save_file}.traps"
+        scraper.traps.logger = get_logger("TRAPS")
+        if self._resumes_from(self.traps_file):
+            scraper.traps.load(self.traps_file)
+            self.logger.info(f"Loaded trap counters from {self.traps_file}.")
+        # and the report, checkpointed as the crawl goes.
+        self.report_file = f"{config.save_file}.report"
+        if config.report_words:
+            scraper.report.limit_words(config.report_words)
+        if self._resumes_from(self.report_file):
+            scraper.report.load(self.report_file)
+            self.logger.info(f"Loaded the report from {self.report_file}.")
+        scraper.report.checkpoint_every(self.report_file, config.report_interval)
+        self.metrics = MetricsReporter(
+            metrics, f"{config.save_file}.metrics", config.metrics_interval,
+            config.metrics_port)
+        start_parse_pool(config)
         self.workers = list()
         self.worker_factory = worker_factory
 
+    def _resumes_from(self, path):
+        '''
+        True if path, saved next to the save file, should be loaded. It is
+        deleted instead unless the frontier resumed from that save file.
+        '''
+        if not self.frontier.resumed:
+            if os.path.exists(path):
+                os.remove(path)
+            return False
+        return os.path.exists(path)
+
     def start_async(self):
+        self.metrics.start()
+        if self.config.sitemaps:
+            # read in the background, the workers start on the seeds meanwhile.
+            self.frontier.add_seed_sitemaps()
         self.workers = [
             self.worker_factory(worker_id, self.config, self.frontier)
             for worker_id in range(self.config.threads_count)]
@@ -24,8 +69,18 @@ class Crawler(object):
     def join(self):
         for worker in self.workers:
             worker.join()
-    
-    def _add_sitemap_urls(self) -> None:
-        urls_to_add = get_sitemap_urls(self.config.seed_urls, self.config, self.logger)
-        for url in urls_to_add:
-            self.frontier.add_url(url)
\ No newline at end of file
+        self.frontier.close()
+        scraper.simhash.dump(self.simhash_file)
+        scraper.report.dump(self.report_file)
+        scraper.traps.dump(self.traps_file)
+        stop_parse_pool()
+        self.metrics.stop()
+        self.logger.info(f"Urls rejected per filter rule: {url_filter.rejection_counts()}")
+        self.logger.info(
+            f"Skipped {scraper.simhash.exact_duplicates} exact duplicate pages "
+            f"out of {scraper.simhash.exact_checks} checked.")
+        self.logger.info(
+            f"Trap detector: {scraper.traps.counters()}, "
+            f"{self.frontier.trap_drops} queued urls dropped.")
+        for template, counters in scraper.traps.worst_templates():
+            self.logger.info(f"Flagged {template}: {counters}")
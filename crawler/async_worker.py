@@ -0,0 +1,88 @@
+import asyncio
+import math
+
+from concurrent.futures import ThreadPoolExecutor
+from inspect import getsource
+from threading import Thread
+
+from utils import get_logger
+from utils.metrics import metrics
+from utils.download import HTML_CONTENT_TYPES
+from utils.async_download import create_session, download_async
+from crawler.parse_pool import get_parse_pool
+import scraper
+
+# how long to sleep while only other workers' urls are in flight.
+IDLE_POLL = 0.1
+
+
+class AsyncWorker(Thread):
+    '''
+    Worker running an asyncio event loop with up to config.concurrency
+    downloads in flight at once. Parsing happens on a pool of
+    config.parsers threads, which hand it on to the parsing processes if
+    there are any, and frontier updates on the loop's default executor, so
+    neither blocks the downloads.
+    '''
+    def __init__(self, worker_id, config, frontier):
+        self.logger = get_logger(f"AsyncWorker-{worker_id}", "Worker")
+        self.config = config
+        self.frontier = frontier
+        # parsing threads hand pages to the shared process pool if there is one.
+        pool = get_parse_pool()
+        self.scrape = pool.scrape if pool is not None else scraper.scraper
+        # basic check for requests in scraper
+        assert {getsource(scraper).find(req) for req in {"from requests import", "import requests"}} == {-1}, "Do not use requests in scraper.py"
+        assert {getsource(scraper).find(req) for req in {"from urllib.request import", "import urllib.request"}} == {-1}, "Do not use urllib.request in scraper.py"
+        super().__init__(daemon=True)
+
+    def run(self):
+        asyncio.run(self._crawl())
+        self.logger.info("Frontier is empty. Stopping Crawler.")
+
+    async def _crawl(self):
+        with ThreadPoolExecutor(self.config.parsers) as parse_threads:
+            async with create_session(self.config) as session:
+                running = set()
+                while True:
+                    wait = 0
+                    while len(running) < self.config.concurrency:
+                        url, wait = self.frontier.poll_tbd_url()
+                        if url is None:
+                            break
+                        running.add(asyncio.create_task(
+                            self._process(session, parse_threads, url)))
+                    if wait is None and not running:
+                        break
+
+                    if len(running) >= self.config.concurrency or wait in (None, math.inf):
+                        # only a finished download can make room or add urls.
+                        timeout = None if running else IDLE_POLL
+                    else:
+                        timeout = wait
+                    if not running:
+                        await asyncio.sleep(timeout)
+                        continue
+                    done, running = await asyncio.wait(
+                        running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is not None:
+                            self.logger.error(
+                                f"Failed to process a url: {task.exception()!r}")
+
+    async def _process(self, session, parse_threads, tbd_url):
+        loop = asyncio.get_running_loop()
+        try:
+            with metrics.timer("download"):
+                resp = await download_async(
+                    session, tbd_url, self.config, self.logger, HTML_CONTENT_TYPES)
+            metrics.increment(f"status_{resp.status}")
+            self.logger.info(
+                f"Downloaded {tbd_url}, status <{resp.status}>, "
+                f"using cache {self.config.cache_server}.")
+            scraped_urls = await loop.run_in_executor(
+                parse_threads, self.scrape, tbd_url, resp)
+            await loop.run_in_executor(
+                None, self.frontier.add_urls, scraped_urls, tbd_url)
+        finally:
+            await loop.run_in_executor(None, self.frontier.mark_url_complete, tbd_url)
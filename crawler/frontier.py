@@ -1,83 +1,512 @@
-import os
-import shelve
-import time
-
-from threading import Thread, RLock
-from queue import Queue, Empty
-from urllib.parse import urlparse
-
-from utils import get_logger, get_urlhash, normalize
-from utils.download import download
-from utils.robots import robots_check
-from scraper import is_valid
-
-class Frontier(object):
-    def __init__(self, config, restart):
-        self.logger = get_logger("FRONTIER")
-        self.config = config
-        self.to_be_downloaded = list()
-        self.robot_rules = dict()  # dict[netloc, (list[allowed paths], list[disallowed paths])]
-        
-        if not os.path.exists(self.config.save_file) and not restart:
-            # Save file does not exist, but request to load save.
-            self.logger.info(
-                f"Did not find save file {self.config.save_file}, "
-                f"starting from seed.")
-        elif os.path.exists(self.config.save_file) and restart:
-            # Save file does exists, but request to start from seed.
-            self.logger.info(
-                f"Found save file {self.config.save_file}, deleting it.")
-            os.remove(self.config.save_file)
-        # Load existing save file, or create one if it does not exist.
-        self.save = shelve.open(self.config.save_file)
-        if restart:
-            for url in self.config.seed_urls:
-                self.add_url(url)
-        else:
-            # Set the frontier state with contents of save file.
-            self._parse_save_file()
-            if not self.save:
-                for url in self.config.seed_urls:
-                    self.add_url(url)
-
-    def _parse_save_file(self):
-        ''' This function can be overridden for alternate saving techniques. '''
-        total_count = len(self.save)
-        tbd_count = 0
-        for url, completed in self.save.values():
-            if not completed and is_valid(url):
-                self.to_be_downloaded.append(url)
-                tbd_count += 1
-        self.logger.info(
-            f"Found {tbd_count} urls to be downloaded from {total_count} "
-            f"total urls discovered.")
-
-    def get_tbd_url(self):
-        try:
-            return self.to_be_downloaded.pop()
-        except IndexError:
-            return None
-
-    def add_url(self, url):
-        parsed = urlparse(url)
-        # if new authority, grab sitemap links if any.
-        # only add url if it respects robots.txt.
-        to_add = robots_check(url, self.robot_rules, self.config, self.logger)
-
-        for url in to_add:
-            url = normalize(url)
-            urlhash = get_urlhash(url)
-            if urlhash not in self.save:
-                self.save[urlhash] = (url, False)
-                self.save.sync()
-                self.to_be_downloaded.append(url)
-    
-    def mark_url_complete(self, url):
-        urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            # This should not happen.
-            self.logger.error(
-                f"Completed url {url}, but have not seen it before.")
-
-        self.save[urlhash] = (url, True)
-        self.save.sync()
+import os
+import json
+import time
+import math
+import heapq
+
+from contextlib import contextmanager
+from hashlib import sha256
+from inspect import getsource
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, RLock, Condition
+from queue import Queue, Empty
+from urllib.parse import urlparse
+
+from utils import get_logger, get_urlhash, normalize
+from utils.canonical import cache_info
+from utils.download import download
+from utils.seen import SeenSet, url_digest
+from utils.robots import RobotsCache, ALLOW_ALL
+from utils.sitemap import get_sitemap_urls
+from utils.metrics import metrics, TOP_HOSTS
+from crawler.store import FrontierStore
+from crawler.priority import UrlScorer
+from utils import url_filter
+from scraper import is_valid, traps
+
+
+def filter_rules_version():
+    '''Hash of the url filter rules, so saved urls are only re-filtered when they change.'''
+    rules = getsource(is_valid) + getsource(url_filter)
+    return sha256(rules.encode("utf-8")).hexdigest()
+
+
+class Frontier(object):
+    def __init__(self, config, restart, clock=time.monotonic, scorer=None):
+        self.logger = get_logger("FRONTIER")
+        self.config = config
+        # orders the urls of each host, lowest score first.
+        self.scorer = scorer if scorer is not None else UrlScorer(traps)
+        self.trap_drops = 0         # queued urls dropped once their template was blocked
+        # urls whose canonical form was already seen, though they were spelled differently.
+        self.canonical_duplicates = 0
+        self.robots = RobotsCache(config, self.logger, config.robots_ttl)
+        # urls of hosts whose robots.txt is being fetched, added once it is parsed.
+        self.parked = dict()        # dict[netloc, list[(url, depth)]]
+        self.parked_at = dict()     # dict[netloc, clock time its first url was parked]
+        # as many at once as the workers download, which is every asyncio
+        # worker's concurrency rather than one per thread with that engine.
+        fetchers = config.threads_count
+        if config.engine == "asyncio":
+            fetchers *= config.concurrency
+        self.robots_fetcher = ThreadPoolExecutor(
+            max(fetchers, 1), thread_name_prefix="robots")
+        # sitemaps are read on threads of their own, as each of their downloads
+        # waits for its host's politeness, so robots.txt fetches never queue behind them.
+        self.sitemap_fetcher = ThreadPoolExecutor(
+            max(fetchers, 1), thread_name_prefix="sitemaps")
+        self.sitemaps_fetched = set()   # sitemap urls already read, saved across resumes
+        self.sitemap_fetches = 0        # robots.txt whose sitemaps are being read
+        # in memory digests of every url in the save file, checked before it.
+        self.seen = SeenSet()
+        self.seen_file = f"{self.config.save_file}.seen"
+
+        # Politeness scheduling. Every netloc with queued urls and none in
+        # flight appears exactly once in one of the heaps, keyed by the earliest
+        # time it may be fetched again, which is counted from when its last
+        # download completed. Hosts past their page budget are only served
+        # when no other host may be fetched.
+        self.clock = clock
+        self.host_queues = dict()   # dict[netloc, heap of (score, sequence, url, depth)]
+        self.host_heap = list()     # heap of (next allowed fetch time, netloc)
+        self.over_budget_heap = list()  # same, for hosts past config.host_budget pages
+        self.next_fetch = dict()    # dict[netloc, next allowed fetch time]
+        self.scheduled = set()      # netlocs in one of the heaps
+        self.busy = set()           # netlocs with a download in flight
+        # netlocs a robots.txt or sitemap download is waiting on, skipped by the workers.
+        self.reserved = set()
+        self.fetched = Counter()    # Counter[netloc] of urls handed out, completed ones on resume
+        self.sequence = 0           # queue order, breaking ties between equal scores
+        self.in_flight = 0          # urls handed out but not yet marked complete
+        self.depths = dict()        # dict[url, depth] of the urls in flight
+        # Each host keeps at most twice host_window urls in memory. Past that,
+        # all but its host_window best are spilled to the save file, and paged
+        # back in, best first, once its queue drains.
+        self.host_window = config.host_window
+        self.spilled = Counter()    # Counter[netloc] of the urls spilled to the save file
+        self.lock = RLock()
+        self.has_work = Condition(self.lock)
+        metrics.gauge("queued_urls", self.queued_count)
+        metrics.gauge("queued_hosts", lambda: len(self.host_queues))
+        metrics.gauge("in_flight", lambda: self.in_flight)
+        metrics.gauge("parked_hosts", lambda: len(self.parked))
+        metrics.gauge("host_queue_depth", self.queue_depths)
+        metrics.gauge("spilled_urls", lambda: sum(self.spilled.values()))
+        metrics.gauge("traps", traps.counters)
+        metrics.gauge("trap_drops", lambda: self.trap_drops)
+        metrics.gauge("filter_rejections", url_filter.rejection_counts)
+
+        # True if the crawl picks up from an existing save file, so the files
+        # saved next to it (SAVE.seen, SAVE.simhash, ...) belong to it.
+        self.resumed = not restart and os.path.exists(self.config.save_file)
+        if not os.path.exists(self.config.save_file) and not restart:
+            # Save file does not exist, but request to load save.
+            self.logger.info(
+                f"Did not find save file {self.config.save_file}, "
+                f"starting from seed.")
+            if os.path.exists(self.seen_file):
+                os.remove(self.seen_file)
+        elif os.path.exists(self.config.save_file) and restart:
+            # Save file does exists, but request to start from seed.
+            self.logger.info(
+                f"Found save file {self.config.save_file}, deleting it.")
+            FrontierStore.remove(self.config.save_file)
+            if os.path.exists(self.seen_file):
+                os.remove(self.seen_file)
+        # Load existing save file, or create one if it does not exist.
+        self.save = FrontierStore(
+            self.config.save_file, self.config.commit_batch,
+            self.config.commit_interval)
+        if restart:
+            for url in self.config.seed_urls:
+                self.add_url(url)
+        else:
+            # Set the frontier state with contents of save file.
+            self._parse_save_file()
+            self.sitemaps_fetched.update(
+                json.loads(self.save.get_meta("sitemaps_fetched") or "[]"))
+            if not self.save:
+                for url in self.config.seed_urls:
+                    self.add_url(url)
+        self.save.set_meta("filter_rules", filter_rules_version())
+
+    def _parse_save_file(self):
+        ''' This function can be overridden for alternate saving techniques. '''
+        total_count = len(self.save)
+        # the seen set snapshot is only trusted if nothing was added since it was written.
+        seen = SeenSet.load(self.seen_file, total_count)
+        if seen is not None:
+            self.seen = seen
+        else:
+            for urlhash in self.save.hashes():
+                self.seen.add(url_digest(urlhash))
+
+        if self.save.get_meta("filter_rules") != filter_rules_version():
+            kept, filtered = self.save.refilter(is_valid)
+            self.logger.info(
+                f"Filter rules changed, {kept} urls to be downloaded "
+                f"and {filtered} filtered out after re-checking.")
+
+        self.fetched.update(self.save.completed_per_host())
+        self.spilled.update(self.save.spilled_per_host())
+        tbd_count = 0
+        for netloc, url, depth in self.save.to_be_downloaded():
+            self._enqueue(url, depth, netloc)
+            tbd_count += 1
+        for netloc in list(self.spilled):
+            if netloc not in self.host_queues:
+                self._page_in(netloc)
+        self.logger.info(
+            f"Found {tbd_count} urls to be downloaded and "
+            f"{sum(self.spilled.values())} spilled from {total_count} "
+            f"total urls discovered.")
+        self._log_seen_memory()
+
+    def get_tbd_url(self):
+        '''
+        Block until some host is allowed to be fetched and return one of its urls.
+        Return None once nothing is queued and no other worker can add more.
+        '''
+        with self.has_work:
+            while True:
+                url, wait = self.poll_tbd_url()
+                if url is not None:
+                    return url
+                if wait is None:
+                    # wake up everyone else waiting so they stop too.
+                    self.has_work.notify_all()
+                    return None
+                # an in flight url may still add links while nothing is queued.
+                self.has_work.wait(None if wait == math.inf else wait)
+
+    def poll_tbd_url(self):
+        '''
+        Non blocking get_tbd_url. Returns (url, 0) if a host may be fetched now,
+        (None, seconds) until the next host may be, which is math.inf while
+        only in flight urls or pending robots.txt and sitemap fetches can add or
+        free more,
+        or (None, None) once the crawl is over.
+        '''
+        with metrics.timer("frontier_pop"), self.lock:
+            now = self.clock()
+            while True:
+                netloc, wait = self._next_host(now)
+                if netloc is None:
+                    break
+                url = self._dispatch(netloc)
+                if url is not None:
+                    return url, 0
+            if wait is not None:
+                return None, wait
+            # hosts held by host_slot are scheduled again once it is done.
+            if self.in_flight or self.busy or self.reserved or self.parked or self.sitemap_fetches:
+                return None, math.inf
+            return None, None
+
+    def add_url(self, url):
+        self.add_urls([url])
+
+    def add_urls(self, urls, parent=None):
+        '''
+        Add every url that respects its host's robots.txt, one link deeper
+        than parent, the url they were found on, if it is given. Urls of hosts
+        whose robots.txt is not known yet are parked while it is fetched in
+        the background, once per host, so the caller never waits on it.
+        '''
+        with metrics.timer("frontier_add"):
+            canonical_urls = [normalize(url) for url in urls]
+            # spellings that would have been queued separately before canonicalization.
+            respelled = {
+                canonical for url, canonical in zip(urls, canonical_urls) if url != canonical}
+            allowed, unknown = self.robots.check(canonical_urls)
+
+            with self.lock:
+                depth = self.depths.get(parent, -1) + 1 if parent is not None else 0
+                self._add_allowed(allowed, depth, respelled)
+                for netloc, host_urls in unknown.items():
+                    if netloc in self.parked:
+                        self.parked[netloc].extend((url, depth) for url in host_urls)
+                        continue
+                    rules = self.robots.lookup(netloc)
+                    if rules is not None:
+                        # fetched since they were checked.
+                        self._add_allowed(
+                            (url for url in host_urls if rules.allows_url(url)), depth)
+                        continue
+                    self.parked[netloc] = [(url, depth) for url in host_urls]
+                    self.parked_at[netloc] = self.clock()
+                    self.robots_fetcher.submit(
+                        self._fetch_robots, urlparse(host_urls[0]).scheme, netloc)
+
+    def _add_allowed(self, urls, depth, respelled=()):
+        '''Add canonical urls already checked against robots.txt.'''
+        with self.lock:
+            for url in urls:
+                urlhash = get_urlhash(url)
+                if self.seen.add(url_digest(urlhash)):
+                    self.save[urlhash] = (url, False, depth)
+                    self._enqueue(url, depth)
+                elif url in respelled:
+                    self.canonical_duplicates += 1
+                    metrics.increment("dedup_canonical")
+                else:
+                    metrics.increment("dedup_seen")
+
+    def _fetch_robots(self, scheme, netloc):
+        '''Fetch netloc's robots.txt, then add its parked urls that respect it, and queue its sitemaps to be read.'''
+        try:
+            # the robots.txt download takes the host's politeness slot like any other.
+            with self.host_slot(netloc), metrics.timer("robots_fetch"):
+                rules = self.robots.fetch(scheme, netloc)
+        except Exception as err:
+            self.logger.error(f"Failed to fetch robots.txt of {netloc}: {err!r}")
+            # cached, so the host's later links are not parked for another try.
+            rules = ALLOW_ALL
+            self.robots.store(netloc, rules)
+        with self.has_work:
+            parked = self.parked.pop(netloc)
+            metrics.observe("robots_wait", self.clock() - self.parked_at.pop(netloc))
+            allowed = [(url, depth) for url, depth in parked if rules.allows_url(url)]
+            for url, depth in allowed:
+                self._add_allowed((url,), depth)
+            self.logger.info(
+                f"Fetched robots.txt of {netloc}, "
+                f"{len(allowed)} of {len(parked)} parked urls allowed.")
+            sitemaps = list()
+            if self.config.sitemaps:
+                sitemaps = [
+                    sitemap for sitemap in rules.sitemaps
+                    if sitemap not in self.sitemaps_fetched]
+            if sitemaps:
+                # keeps the crawl going until their pages are added.
+                self.sitemap_fetches += 1
+            # workers waiting on an empty frontier may now have urls, or be able to stop.
+            self.has_work.notify_all()
+        if sitemaps:
+            self.sitemap_fetcher.submit(self._add_sitemaps, netloc, sitemaps)
+
+    def add_seed_sitemaps(self):
+        '''Add the pages listed in the /sitemap.xml of every seed host, read in the background.'''
+        sitemaps = list()
+        for seed_url in self.config.seed_urls:
+            parsed = urlparse(seed_url)
+            sitemap = f"{parsed.scheme}://{parsed.netloc}/sitemap.xml"
+            if sitemap not in self.sitemaps_fetched and sitemap not in sitemaps:
+                sitemaps.append(sitemap)
+        if not sitemaps:
+            return
+        with self.has_work:
+            # keeps the crawl going until their pages are added.
+            self.sitemap_fetches += 1
+        self.sitemap_fetcher.submit(self._add_sitemaps, "the seed hosts", sitemaps)
+
+    def _add_sitemaps(self, source, sitemaps):
+        '''Add the pages listed in the sitemaps of source, most recently modified first.'''
+        try:
+            # every sitemap download takes its host's politeness slot.
+            urls = get_sitemap_urls(
+                sitemaps, self.config, self.logger, self.sitemaps_fetched, self.host_slot)
+            self.logger.info(f"Found {len(urls)} urls in the sitemaps of {source}.")
+            self.add_urls(urls)
+        except Exception as err:
+            self.logger.error(f"Failed to read the sitemaps of {source}: {err!r}")
+        finally:
+            self._save_sitemaps_fetched()
+            with self.has_work:
+                self.sitemap_fetches -= 1
+                self.has_work.notify_all()
+
+    def _save_sitemaps_fetched(self):
+        '''Save the sitemaps read so far, so a resumed crawl does not read them again.'''
+        # sorted copies the set in one go, while other threads may be adding to it.
+        self.save.set_meta("sitemaps_fetched", json.dumps(sorted(self.sitemaps_fetched)))
+
+    def mark_url_complete(self, url):
+        urlhash = get_urlhash(url)
+        with self.has_work:
+            if url_digest(urlhash) not in self.seen:
+                # This should not happen.
+                self.logger.error(
+                    f"Completed url {url}, but have not seen it before.")
+
+            self.save[urlhash] = (url, True, self.depths.pop(url, 0))
+            self.in_flight -= 1
+            # wakes up workers waiting on the host, or on an empty frontier to stop.
+            self._release(urlparse(url).netloc)
+
+    @contextmanager
+    def host_slot(self, netloc):
+        '''
+        Hold netloc's politeness slot around a download made outside the
+        workers. Blocks until no download of netloc is in flight and its delay
+        is over, the workers leaving the host alone meanwhile.
+        '''
+        with self.has_work:
+            self.reserved.add(netloc)
+            try:
+                while True:
+                    wait = self.next_fetch.get(netloc, 0) - self.clock()
+                    if netloc not in self.busy and wait <= 0:
+                        break
+                    self.has_work.wait(None if netloc in self.busy else wait)
+            finally:
+                self.reserved.discard(netloc)
+            self.busy.add(netloc)
+        try:
+            yield
+        finally:
+            self._release(netloc)
+
+    def _release(self, netloc):
+        '''Start netloc's politeness delay now that its download is done, and schedule it again.'''
+        with self.has_work:
+            self.busy.discard(netloc)
+            self.next_fetch[netloc] = self.clock() + self._politeness(netloc)
+            if netloc in self.host_queues:
+                self._schedule(netloc, self.next_fetch[netloc])
+            self.has_work.notify_all()
+
+    def _enqueue(self, url, depth, netloc=None):
+        '''Queue url under its netloc by score, scheduling the netloc if it was idle.'''
+        if netloc is None:
+            netloc = urlparse(url).netloc
+        with self.has_work:
+            queue = self.host_queues.get(netloc)
+            if queue is None:
+                queue = self.host_queues[netloc] = list()
+                self._schedule(netloc, self.next_fetch.get(netloc, 0))
+                self.has_work.notify()
+            self.sequence += 1
+            heapq.heappush(queue, (self.scorer.score(url, depth), self.sequence, url, depth))
+            if self.host_window and len(queue) >= 2 * self.host_window:
+                self._spill(netloc, queue)
+
+    def _spill(self, netloc, queue):
+        '''Keep the host_window best urls of netloc's queue in memory and save the rest as spilled.'''
+        # a sorted list is still a heap, so the queue is trimmed in place.
+        queue.sort()
+        overflow = queue[self.host_window:]
+        del queue[self.host_window:]
+        self.save.spill(
+            (get_urlhash(url), url, depth, score) for score, _, url, depth in overflow)
+        self.spilled[netloc] += len(overflow)
+        metrics.increment("spills")
+
+    def _page_in(self, netloc):
+        '''Move netloc's best spilled urls back into its queue, scheduling it if it was idle.'''
+        rows = self.save.page_in(netloc, self.host_window)
+        self.spilled[netloc] -= len(rows)
+        if self.spilled[netloc] <= 0:
+            del self.spilled[netloc]
+        if not rows:
+            return
+        queue = self.host_queues.get(netloc)
+        if queue is None:
+            queue = self.host_queues[netloc] = list()
+            self._schedule(netloc, self.next_fetch.get(netloc, 0))
+        for url, depth, score in rows:
+            self.sequence += 1
+            heapq.heappush(queue, (score, self.sequence, url, depth))
+        metrics.increment("page_ins")
+
+    def _next_host(self, now):
+        '''
+        Pop a netloc that may be fetched now, preferring the ones within their
+        budget. Returns (netloc, None), or (None, seconds until one may be) if
+        any host has queued urls, else (None, None).
+        '''
+        wait = None
+        for heap in (self.host_heap, self.over_budget_heap):
+            while heap:
+                fetch_at, netloc = heap[0]
+                if netloc in self.reserved or netloc in self.busy:
+                    # left to host_slot, which schedules it again once done.
+                    heapq.heappop(heap)
+                    self.scheduled.discard(netloc)
+                    continue
+                if fetch_at <= now:
+                    heapq.heappop(heap)
+                    self.scheduled.discard(netloc)
+                    return netloc, None
+                wait = fetch_at - now if wait is None else min(wait, fetch_at - now)
+                break
+        return None, wait
+
+    def _dispatch(self, netloc):
+        '''
+        Hand out the best url of an eligible netloc, which is rescheduled once
+        the url is marked complete. Urls of templates blocked as traps since
+        they were queued are dropped on the way. Spilled urls are paged in as
+        the queue drains. Returns None if that leaves nothing to hand out.
+        '''
+        queue = self.host_queues[netloc]
+        while True:
+            _, _, url, depth = heapq.heappop(queue)
+            if not queue and netloc in self.spilled:
+                self._page_in(netloc)
+            if not traps.is_blocked(url):
+                break
+            self.save.mark_filtered(get_urlhash(url), url, depth)
+            self.trap_drops += 1
+            if not queue:
+                del self.host_queues[netloc]
+                return None
+        # the host stays out of the heaps until mark_url_complete.
+        self.busy.add(netloc)
+        self.fetched[netloc] += 1
+        if not queue:
+            del self.host_queues[netloc]
+        self.in_flight += 1
+        self.depths[url] = depth
+        return url
+
+    def _schedule(self, netloc, fetch_at):
+        '''Put netloc in the heap matching its page budget, unless it is already in one or in flight.'''
+        if netloc in self.scheduled or netloc in self.busy:
+            return
+        self.scheduled.add(netloc)
+        budget = self.config.host_budget
+        if budget and self.fetched[netloc] >= budget:
+            heapq.heappush(self.over_budget_heap, (fetch_at, netloc))
+        else:
+            heapq.heappush(self.host_heap, (fetch_at, netloc))
+
+    def _politeness(self, netloc):
+        '''Seconds between two fetches of netloc, longer if its robots.txt asks for it.'''
+        crawl_delay = self.robots.crawl_delay(netloc)
+        if crawl_delay is None:
+            return self.config.time_delay
+        return max(self.config.time_delay, crawl_delay)
+
+    def close(self):
+        '''Commit anything still buffered and close the save file.'''
+        self.robots_fetcher.shutdown()
+        self.sitemap_fetcher.shutdown()
+        with self.lock:
+            self.save.close()
+            self.seen.dump(self.seen_file)
+            self._log_seen_memory()
+            self.logger.info(
+                f"Canonicalization caught {self.canonical_duplicates} urls "
+                f"already queued under another spelling ({cache_info()}).")
+
+    def queued_count(self):
+        '''Urls queued across every host.'''
+        with self.lock:
+            return sum(len(queue) for queue in self.host_queues.values())
+
+    def queue_depths(self, n=TOP_HOSTS):
+        '''The n hosts with the most queued urls, with their counts.'''
+        with self.lock:
+            return dict(heapq.nlargest(
+                n, ((netloc, len(queue)) for netloc, queue in self.host_queues.items()),
+                key=lambda item: item[1]))
+
+    def _log_seen_memory(self):
+        count = len(self.seen)
+        usage = self.seen.memory_usage()
+        self.logger.info(
+            f"Seen set holds {count} urls in {usage / 2**20:.1f} MiB "
+            f"({usage / max(count, 1):.0f} bytes per url).")
@@ -0,0 +1,71 @@
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+from threading import BoundedSemaphore
+
+import scraper
+
+# the pool shared by every worker, see start_parse_pool.
+_pool = None
+
+
+class ParsePool(object):
+    '''
+    Runs scraper.analyze, the CPU bound part of scraping, on a pool of
+    processes so it does not serialize on the GIL. Workers block in
+    submit once max_in_flight pages are waiting to be analyzed, which
+    keeps fetching from running ahead of parsing.
+    '''
+    def __init__(self, processes, max_in_flight):
+        # spawned rather than forked, since workers may be mid operation in
+        # other threads whenever the pool starts a process.
+        context = multiprocessing.get_context("spawn")
+        self.executor = ProcessPoolExecutor(processes, mp_context=context)
+        self.slots = BoundedSemaphore(max_in_flight)
+
+    def submit(self, url, resp):
+        '''
+        Queue the response for analysis, blocking while the pool is full.
+        Returns a future of scraper.analyze's result, or None if there is nothing to analyze.
+        '''
+        content = scraper.new_content(url, resp)
+        if content is None:
+            return None
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(scraper.analyze, resp.url or url, content)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def scrape(self, url, resp):
+        '''Same as scraper.scraper, with the analysis done in the pool.'''
+        future = self.submit(url, resp)
+        if future is None:
+            return []
+        return scraper.record(url, future.result())
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+def start_parse_pool(config):
+    '''Starts the shared pool if config asks for parsing processes. Returns it, or None.'''
+    global _pool
+    if config.parse_processes and _pool is None:
+        _pool = ParsePool(config.parse_processes, config.parse_queue)
+    return _pool
+
+
+def get_parse_pool():
+    '''Returns the shared pool, or None if pages are parsed in the worker threads.'''
+    return _pool
+
+
+def stop_parse_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
@@ -0,0 +1,47 @@
+import math
+
+from collections import Counter
+from urllib.parse import urlparse, ParseResult, parse_qsl
+
+from utils.traps import TrapDetector, path_template
+
+
+DEPTH_WEIGHT = 1.0      # per link followed from a seed
+REPEAT_WEIGHT = 2.0     # per path segment repeated within the same path
+NOVELTY_WEIGHT = 1.0    # per doubling of the urls already queued with the same shape
+
+
+class UrlScorer(object):
+    '''
+    Scores urls for the frontier, lower scores are crawled first within a host.
+
+    Shallow urls beat deep ones, paths repeating a segment lose ground, and a
+    url of a shape already queued many times, e.g. the thousandth day of a
+    calendar or revision of a wiki page, loses ground the more of them there
+    are. Templates the trap detector flagged are pushed further back still.
+    Subclass it and pass it to the Frontier to crawl in another order.
+    '''
+    def __init__(self, traps: TrapDetector=None):
+        self.traps = traps
+        self.shapes = Counter()     # Counter[shape] of every url scored
+
+    def score(self, url: str, depth: int) -> float:
+        '''Score a url found depth links away from a seed. Called once per url queued.'''
+        parsed = urlparse(url)
+        segments = [segment for segment in parsed.path.split("/") if segment]
+        repeats = len(segments) - len(set(segments))
+        shape = url_shape(parsed)
+        self.shapes[shape] += 1
+        score = (
+            DEPTH_WEIGHT * depth
+            + REPEAT_WEIGHT * repeats
+            + NOVELTY_WEIGHT * math.log2(self.shapes[shape]))
+        if self.traps is not None:
+            score += self.traps.penalty(url)
+        return score
+
+
+def url_shape(parsed: ParseResult) -> str:
+    '''The url with its numbers and query values left out, shared by the pages of a trap.'''
+    keys = sorted({key for key, _ in parse_qsl(parsed.query, keep_blank_values=True)})
+    return f"{path_template(parsed)}?{'&'.join(keys)}"
@@ -0,0 +1,309 @@
+import os
+import sqlite3
+import time
+
+from threading import Event, RLock, Thread
+from urllib.parse import urlparse
+
+
+# values of the urls.state column
+TO_BE_DOWNLOADED = 0
+COMPLETED = 1
+FILTERED = 2    # not completed, but rejected by the current filter rules
+SPILLED = 3     # to be downloaded, but kept out of memory until its host's queue drains
+# rows read at a time when iterating over the store.
+READ_BATCH = 10000
+
+
+class FrontierStore(object):
+    '''
+    Persistent mapping of urlhash -> (url, completed, depth) backed by SQLite in WAL mode.
+
+    Writes are buffered and group committed once `batch_size` of them are
+    pending or `interval` seconds have passed since the last commit, by a
+    background thread if no other write comes along by then, so a crash
+    loses at most the writes since the last commit. An interval of 0 only
+    commits full batches. It keeps the small part of the shelve interface
+    used by the Frontier.
+
+    Urls still to be downloaded are indexed by netloc separately from the
+    completed ones, and counted per netloc and state, so resuming a crawl
+    only reads the pending urls. Urls spilled out of the frontier's memory
+    are indexed by netloc and score, so the best of them are paged back in
+    first.
+    '''
+    def __init__(self, path, batch_size=1000, interval=1.0, clock=time.monotonic):
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self.clock = clock
+        self.buffer = dict()    # dict[urlhash, (url, state, depth, score)] not yet committed
+        self.last_commit = clock()
+        self.commits = 0
+        self.lock = RLock()
+        self.stopped = Event()
+        self.committer = Thread(
+            target=self._commit_periodically, name="store-commit", daemon=True)
+
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # every commit is flushed to disk, which is cheap now that they are batched.
+        self.db.execute("PRAGMA synchronous=FULL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS urls ("
+            "urlhash TEXT PRIMARY KEY, url TEXT NOT NULL, "
+            "netloc TEXT NOT NULL, state INTEGER NOT NULL, "
+            "depth INTEGER NOT NULL DEFAULT 0, score REAL NOT NULL DEFAULT 0)")
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(urls)")]
+        if "depth" not in columns:
+            # saved before urls had a depth, they are all treated as seeds.
+            self.db.execute("ALTER TABLE urls ADD COLUMN depth INTEGER NOT NULL DEFAULT 0")
+        if "score" not in columns:
+            # only spilled urls need one, and there were none before.
+            self.db.execute("ALTER TABLE urls ADD COLUMN score REAL NOT NULL DEFAULT 0")
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS to_be_downloaded ON urls (netloc) "
+            "WHERE state = 0")
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS spilled ON urls (netloc, score) "
+            "WHERE state = 3")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._create_counts()
+        if self.interval > 0:
+            self.committer.start()
+
+    def _create_counts(self):
+        '''
+        Keep the number of urls of every netloc in every state in the counts
+        table, up to date through triggers on urls, so the per host counts
+        and the total are read without scanning urls. A store saved before
+        there was one is counted once here.
+        '''
+        exists = self.db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'counts'").fetchone()
+        self.db.execute("BEGIN")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS counts ("
+            "netloc TEXT NOT NULL, state INTEGER NOT NULL, count INTEGER NOT NULL, "
+            "PRIMARY KEY (netloc, state)) WITHOUT ROWID")
+        if not exists:
+            self.db.execute(
+                "INSERT INTO counts SELECT netloc, state, COUNT(*) FROM urls "
+                "GROUP BY netloc, state")
+        self.db.execute(
+            "CREATE TRIGGER IF NOT EXISTS count_insert AFTER INSERT ON urls BEGIN "
+            "INSERT INTO counts VALUES (new.netloc, new.state, 1) "
+            "ON CONFLICT (netloc, state) DO UPDATE SET count = count + 1; END")
+        self.db.execute(
+            "CREATE TRIGGER IF NOT EXISTS count_update AFTER UPDATE OF state ON urls "
+            "WHEN old.state != new.state BEGIN "
+            "UPDATE counts SET count = count - 1 WHERE netloc = old.netloc AND state = old.state; "
+            "INSERT INTO counts VALUES (new.netloc, new.state, 1) "
+            "ON CONFLICT (netloc, state) DO UPDATE SET count = count + 1; END")
+        self.db.execute("COMMIT")
+
+    @staticmethod
+    def remove(path):
+        '''Delete the store at path along with its WAL files.'''
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    def __contains__(self, urlhash):
+        with self.lock:
+            if urlhash in self.buffer:
+                return True
+            return self.db.execute(
+                "SELECT 1 FROM urls WHERE urlhash = ?", (urlhash,)).fetchone() is not None
+
+    def __getitem__(self, urlhash):
+        with self.lock:
+            row = self.buffer.get(urlhash)
+            if row is None:
+                row = self.db.execute(
+                    "SELECT url, state, depth FROM urls WHERE urlhash = ?", (urlhash,)).fetchone()
+        if row is None:
+            raise KeyError(urlhash)
+        return row[0], row[1] == COMPLETED, row[2]
+
+    def __setitem__(self, urlhash, value):
+        url, completed, depth = value
+        self._write(urlhash, url, COMPLETED if completed else TO_BE_DOWNLOADED, depth)
+
+    def mark_filtered(self, urlhash, url, depth):
+        '''Save a url that will not be downloaded, though it passed the filter rules when it was added.'''
+        self._write(urlhash, url, FILTERED, depth)
+
+    def spill(self, urls):
+        '''Save (urlhash, url, depth, score) of urls to be downloaded that the frontier no longer keeps in memory.'''
+        for urlhash, url, depth, score in urls:
+            self._write(urlhash, url, SPILLED, depth, score)
+
+    def page_in(self, netloc, count):
+        '''
+        Returns (url, depth, score) of the count best scored spilled urls of
+        netloc, lowest score first, and saves them as to be downloaded again.
+        '''
+        with self.lock:
+            self.sync()
+            rows = self.db.execute(
+                "SELECT urlhash, url, depth, score FROM urls "
+                "WHERE netloc = ? AND state = ? ORDER BY score LIMIT ?",
+                (netloc, SPILLED, count)).fetchall()
+            self.db.execute("BEGIN")
+            self.db.executemany(
+                "UPDATE urls SET state = ? WHERE urlhash = ?",
+                ((TO_BE_DOWNLOADED, urlhash) for urlhash, _, _, _ in rows))
+            self.db.execute("COMMIT")
+        return [(url, depth, score) for _, url, depth, score in rows]
+
+    def spilled_per_host(self):
+        '''Returns the number of spilled urls of every netloc.'''
+        return self._per_host(SPILLED)
+
+    def _per_host(self, state):
+        '''Returns the number of urls in state of every netloc that has any.'''
+        with self.lock:
+            self.sync()
+            rows = self.db.execute(
+                "SELECT netloc, count FROM counts WHERE state = ? AND count > 0",
+                (state,)).fetchall()
+        return dict(rows)
+
+    def _write(self, urlhash, url, state, depth, score=0.0):
+        with self.lock:
+            self.buffer[urlhash] = (url, state, depth, score)
+            if (len(self.buffer) >= self.batch_size
+                    or 0 < self.interval <= self.clock() - self.last_commit):
+                self.sync()
+
+    def __len__(self):
+        with self.lock:
+            self.sync()
+            return self.db.execute("SELECT COALESCE(SUM(count), 0) FROM counts").fetchone()[0]
+
+    def values(self):
+        '''Yield every (url, completed, depth), including uncommitted ones.'''
+        for _, value in self.items():
+            yield value
+
+    def items(self):
+        '''Yield every (urlhash, (url, completed, depth)) pair, including uncommitted ones.'''
+        for urlhash, url, state, depth in self._scan("urlhash, url, state, depth"):
+            yield urlhash, (url, state == COMPLETED, depth)
+
+    def hashes(self):
+        '''Yield the urlhash of every url ever added.'''
+        for (urlhash,) in self._scan("urlhash"):
+            yield urlhash
+
+    def to_be_downloaded(self):
+        '''
+        Yield (netloc, url, depth) for every url that passed the filter rules
+        but is not completed, except the spilled ones, see page_in.
+        '''
+        # one host at a time, so every batch is a range of the to_be_downloaded
+        # index rather than a walk over the completed urls between them.
+        for netloc in self._per_host(TO_BE_DOWNLOADED):
+            for url, depth in self._scan(
+                    "url, depth", f"netloc = ? AND state = {TO_BE_DOWNLOADED}", (netloc,)):
+                yield netloc, url, depth
+
+    def _scan(self, columns, where="1", params=()):
+        '''
+        Yield the columns of every row matching where, in rowid order, after
+        committing the buffer. Rows are read READ_BATCH at a time, each batch
+        resuming after the last rowid read, so the table is never held in
+        memory at once and the store stays usable between batches. Rows
+        written meanwhile keep their rowid, see sync.
+        '''
+        with self.lock:
+            self.sync()
+        last = 0
+        while True:
+            with self.lock:
+                rows = self.db.execute(
+                    f"SELECT rowid, {columns} FROM urls WHERE rowid > ? AND {where} "
+                    f"ORDER BY rowid LIMIT ?", (last, *params, READ_BATCH)).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            for row in rows:
+                yield row[1:]
+
+    def completed_per_host(self):
+        '''Returns the number of completed urls of every netloc.'''
+        return self._per_host(COMPLETED)
+
+    def refilter(self, is_valid):
+        '''
+        Re-run is_valid on every url that is not completed, moving urls
+        between the to be downloaded and filtered states to match. Spilled
+        urls that are still valid stay spilled.
+        Returns the number of urls now to be downloaded and filtered.
+        '''
+        with self.lock:
+            self.sync()
+            rows = self.db.execute(
+                "SELECT urlhash, url, state FROM urls WHERE state != ?",
+                (COMPLETED,)).fetchall()
+            updates = list()
+            kept = 0
+            for urlhash, url, state in rows:
+                if is_valid(url):
+                    new_state = SPILLED if state == SPILLED else TO_BE_DOWNLOADED
+                else:
+                    new_state = FILTERED
+                kept += new_state != FILTERED
+                if new_state != state:
+                    updates.append((new_state, urlhash))
+            self.db.execute("BEGIN")
+            self.db.executemany("UPDATE urls SET state = ? WHERE urlhash = ?", updates)
+            self.db.execute("COMMIT")
+        return kept, len(rows) - kept
+
+    def get_meta(self, key):
+        with self.lock:
+            row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def sync(self):
+        '''Commit every buffered write in a single transaction.'''
+        with self.lock:
+            if self.buffer:
+                self.db.execute("BEGIN")
+                # an upsert rather than INSERT OR REPLACE, which would give
+                # the row a new rowid and skip the counts' update trigger.
+                self.db.executemany(
+                    "INSERT INTO urls VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (urlhash) DO UPDATE SET url = excluded.url, "
+                    "state = excluded.state, depth = excluded.depth, score = excluded.score",
+                    ((urlhash, url, urlparse(url).netloc, state, depth, score)
+                     for urlhash, (url, state, depth, score) in self.buffer.items()))
+                self.db.execute("COMMIT")
+                self.buffer.clear()
+                self.commits += 1
+            self.last_commit = self.clock()
+
+    def _commit_periodically(self):
+        '''Commit the buffer whenever it is due, even while nothing else is written.'''
+        timeout = self.interval
+        while not self.stopped.wait(timeout):
+            with self.lock:
+                timeout = self.last_commit + self.interval - self.clock()
+                if timeout <= 0:
+                    self.sync()
+                    timeout = self.interval
+
+    def close(self):
+        if self.committer.is_alive():
+            self.stopped.set()
+            self.committer.join()
+        with self.lock:
+            self.sync()
+            self.db.close()
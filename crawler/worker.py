@@ -1,10 +1,11 @@
 from threading import Thread
 
 from inspect import getsource
-from utils.download import download
+from utils.download import download, HTML_CONTENT_TYPES
 from utils import get_logger
+from utils.metrics import metrics
+from crawler.parse_pool import get_parse_pool
 import scraper
-import time
 
 
 class Worker(Thread):
@@ -12,6 +13,9 @@ class Worker(Thread):
         self.logger = get_logger(f"Worker-{worker_id}", "Worker")
         self.config = config
         self.frontier = frontier
+        # analyze pages in the shared process pool if there is one.
+        pool = get_parse_pool()
+        self.scrape = pool.scrape if pool is not None else scraper.scraper
         # basic check for requests in scraper
         assert {getsource(scraper).find(req) for req in {"from requests import", "import requests"}} == {-1}, "Do not use requests in scraper.py"
         assert {getsource(scraper).find(req) for req in {"from urllib.request import", "import urllib.request"}} == {-1}, "Do not use urllib.request in scraper.py"
@@ -23,12 +27,17 @@ class Worker(Thread):
             if not tbd_url:
                 self.logger.info("Frontier is empty. Stopping Crawler.")
                 break
-            resp = download(tbd_url, self.config, self.logger)
-            self.logger.info(
-                f"Downloaded {tbd_url}, status <{resp.status}>, "
-                f"using cache {self.config.cache_server}.")
-            scraped_urls = scraper.scraper(tbd_url, resp)
-            for scraped_url in scraped_urls:
-                self.frontier.add_url(scraped_url)
-            self.frontier.mark_url_complete(tbd_url)
-            time.sleep(self.config.time_delay)
+            try:
+                with metrics.timer("download"):
+                    resp = download(
+                        tbd_url, self.config, self.logger, HTML_CONTENT_TYPES)
+                metrics.increment(f"status_{resp.status}")
+                self.logger.info(
+                    f"Downloaded {tbd_url}, status <{resp.status}>, "
+                    f"using cache {self.config.cache_server}.")
+                scraped_urls = self.scrape(tbd_url, resp)
+                self.frontier.add_urls(scraped_urls, tbd_url)
+            finally:
+                # politeness is enforced per host by the frontier, but it
+                # must always hear back so other workers know when to stop.
+                self.frontier.mark_url_complete(tbd_url)
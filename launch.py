@@ -1,23 +1,74 @@
-from configparser import ConfigParser
-from argparse import ArgumentParser
-
-from utils.server_registration import get_cache_server
-from utils.config import Config
-from crawler import Crawler
-
-
-def main(config_file, restart):
-    cparser = ConfigParser()
-    cparser.read(config_file)
-    config = Config(cparser)
-    config.cache_server = get_cache_server(config, restart)
-    crawler = Crawler(config, restart)
-    crawler.start()
-
-
-if __name__ == "__main__":
-    parser = ArgumentParser()
-    parser.add_argument("--restart", action="store_true", default=False)
-    parser.add_argument("--config_file", type=str, default="config.ini")
-    args = parser.parse_args()
-    main(args.config_file, args.restart)
+import time
+
+from configparser import ConfigParser
+from argparse import ArgumentParser
+
+from utils.server_registration import get_cache_server
+from utils.config import Config
+from utils.corpus import record_to, replay_from, close_corpus
+from utils.metrics import metrics
+from utils.profiling import Profiler, stage_report
+from crawler import Crawler
+from crawler.worker import Worker
+import scraper
+
+
+def main(config_file, restart, engine=None, record=None, replay=None,
+         profile=None, trace_memory=False):
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    config = Config(cparser)
+    if engine:
+        config.engine = engine
+    if replay:
+        # the corpus stands in for the cache server, so there is nobody to be polite to,
+        # and the crawl always starts over in its own save file.
+        replay_from(replay)
+        config.time_delay = 0
+        config.save_file = f"{config.save_file}.replay"
+        restart = True
+    else:
+        config.cache_server = get_cache_server(config, restart)
+        if record:
+            record_to(record)
+    # started first, so the threads of the crawler are profiled too.
+    profiler = Profiler(profile, trace_memory)
+    profiler.start()
+    start = time.perf_counter()
+    if config.engine == "asyncio":
+        # only needs aiohttp when it is actually used.
+        from crawler.async_worker import AsyncWorker
+        crawler = Crawler(config, restart, worker_factory=AsyncWorker)
+    else:
+        crawler = Crawler(config, restart, worker_factory=Worker)
+    crawler.start()
+    elapsed = time.perf_counter() - start
+    profiling = profiler.stop()
+    close_corpus()
+    scraper.report.print_report()
+    if replay or profile or trace_memory:
+        print(stage_report(metrics.snapshot(), elapsed))
+        print(profiling, end="")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--restart", action="store_true", default=False)
+    parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default=None)
+    parser.add_argument(
+        "--record", metavar="CORPUS", default=None,
+        help="record every response from the cache server to the CORPUS sqlite file")
+    parser.add_argument(
+        "--replay", metavar="CORPUS", default=None,
+        help="crawl the responses recorded in CORPUS instead of the cache server, "
+             "without politeness, and report pages/s and time per stage")
+    parser.add_argument(
+        "--profile", metavar="STATS", default=None,
+        help="run under cProfile, saving the stats of every thread to STATS")
+    parser.add_argument(
+        "--tracemalloc", action="store_true", default=False,
+        help="trace memory allocations and report the peak and the largest sites")
+    args = parser.parse_args()
+    main(args.config_file, args.restart, args.engine, args.record, args.replay,
+         args.profile, args.tracemalloc)
@@ -1,76 +1,204 @@
+import heapq
+import os
+import pickle
+import time
+from collections import Counter
+from threading import Lock, local
+from urllib.parse import urlparse, ParseResult
+
+from utils.space_saving import SpaceSaving
 from utils.stopwords import STOPWORDS
-from urllib.parse import urlparse
 
 Token = str #for type annotations
 
 
-def _subdomain_check(parsed_url: urlparse.ParseResult, domain = '.ics.uci.edu') -> bool:
+def _subdomain_check(parsed_url: ParseResult, domain = '.ics.uci.edu') -> bool:
     return parsed_url.netloc.endswith(domain) and parsed_url.netloc != 'www.ics.uci.edu' ##if a netloc ends with the domain and is not the domain then it is a subdomain
 
-def _get_total_words(self, frequencies: dict[Token: int]) -> int:
+def _get_total_words(frequencies: dict[Token: int]) -> int:
+
+        return sum(frequencies.values())
+
+def _get_most_common_words(frequencies, n = 50) -> list:
+
+    '''
+    Takes in word frequencies and a threshold (default 50) and returns a list of the n most common words seen ordered. Ties are resolved alphabetically and stopwords are ignored
+    '''
+    return heapq.nsmallest(n, frequencies.items(), key = (lambda x: (x[0] in STOPWORDS, -x[1], x[0]))) #orders by frequency and ties by alphabetical order
+    ##The lamdba function returns a true or false value for the first tuple element, and the true tuples represent
+    ##stop words, which will essentially be pushed to the end as true > false
+    ##nsmallest only keeps n words at a time instead of sorting every word seen
+
+class _Partial:
 
-        total = 0
-        for _, freq in frequencies.items(): #word here doesnt matter
-            total+=freq
-        return freq
+    '''
+    The statistics of the pages added by one worker thread. Only that thread updates it,
+    so its lock is uncontended except while the report is merged or checkpointed.
+    '''
+    def __init__(self, word_frequencies):
+        self.word_frequencies = word_frequencies #a Counter, or a SpaceSaving when the report is bounded
+        self.longest_page = 0
+        self.longest_page_url = None
+        self.ics_subdomains = Counter()
+        self.lock = Lock()
+
+    def add_page(self, url: str, frequencies: dict[Token: int]) -> None:
+        parsed = urlparse(url)
+        if _subdomain_check(parsed): #if a url is in the domain ics, then add to the subdomains
+            self.ics_subdomains[f'{parsed.scheme}://{parsed.netloc}'] += 1
+        self.word_frequencies.update(frequencies)
+        self.update_longest_page(url, _get_total_words(frequencies))
+
+    def update_longest_page(self, url: str, page_length: int) -> None:
+        if page_length > self.longest_page:
+            self.longest_page = page_length
+            self.longest_page_url = url #url will be tracked
+
+    def merge(self, other: '_Partial') -> None:
+        '''Adds the statistics of other into this partial'''
+        words = other.word_frequencies
+        self.word_frequencies.update(words if isinstance(words, Counter) else words.counts)
+        self.ics_subdomains.update(other.ics_subdomains)
+        self.update_longest_page(other.longest_page_url, other.longest_page)
 
 class Report:
-    
+
     '''
     This report will keep track of 50 most common words as well as the longest page in terms of words
     but it will not handle the distinct urls found or the subdomain as the frontier and worker classes
     both log that information
+
+    Every worker thread adds its pages to its own partial report, and the partials are only merged when
+    the report is printed or saved, so workers never wait on each other. By default every word is counted
+    exactly; after limit_words only the most common words are kept, in bounded memory.
     '''
-    def __init__(self):
-        self._word_frequencies = {} #this will keep track of total word frequencies 
-        self._longest_page = 0 
-        self._longest_page_url = None
-        self._ics_subdomains = {} #this will keep track of subdomains and the pages found in the subdomain
-    
+    def __init__(self, clock=time.monotonic):
+        self._partials = [] #every thread's _Partial, plus the ones loaded or merged in
+        self._local = local() #holds the calling thread's _Partial
+        self._max_words = None #words kept per partial, None keeps every word
+        self._lock = Lock() #guards _partials and _max_words
+        self._checkpoint_file = None
+        self._checkpoint_interval = None
+        self._checkpoint_lock = Lock() #only one thread writes a checkpoint at a time
+        self._clock = clock
+        self._last_checkpoint = clock()
+
+    def limit_words(self, max_words: int) -> None:
+
+        '''
+        Keeps at most max_words words per partial from now on, using Space-Saving. The counts of the most
+        common words are then overestimates, but a word is always kept if it is more frequent than
+        total words / max_words. Words counted so far are carried over.
+        '''
+        with self._lock:
+            self._max_words = max_words
+            for partial in self._partials:
+                with partial.lock:
+                    words = self._new_word_frequencies()
+                    words.update(partial.word_frequencies)
+                    partial.word_frequencies = words
+
+    def checkpoint_every(self, path: str, interval: float) -> None:
+
+        '''
+        Saves the report to path whenever interval seconds have passed since the last save, so a crash
+        loses at most that much of it. Checkpoints are written by whichever thread adds a page once the
+        interval is up.
+        '''
+        self._checkpoint_file = path
+        self._checkpoint_interval = interval
+        self._last_checkpoint = self._clock()
+
     def add_page(self,url: str, frequencies: dict[Token: int]) -> None:
-        
+
         '''
         Takes in a url and a frequencies dict and adds an occurence of a subdomain to the _ics_subdomains dict. Also updates the total word
         frequency dict with the frequencies passed in and updates the longest page encountered
         '''
+        partial = self._partial()
+        with partial.lock:
+            partial.add_page(url, frequencies)
+        if (self._checkpoint_file is not None
+                and self._clock() - self._last_checkpoint >= self._checkpoint_interval):
+            self._checkpoint()
 
-        parsed = urlparse(url)
-        if _subdomain_check(parsed): #if a url is in the domain ics, then add to the subdomains 
-            self._ics_subdomains[parsed.scheme + parse.netloc] = self._ics_subdomains.get(parsed.scheme + parse.netloc, 0) + 1
-            ##this increments the pages in a subdomain each time one is detected 
-            ##specifically looks for pages in the ics domain
-        self._update_frequencies(frequencies) ##total frequencies will be updated
-        self._update_longest_page(url, frequencies) ##longest page will be updated
+    def merge(self, other: 'Report') -> None:
+
+        '''
+        Adds the statistics of another report, e.g. one built in another process, to this one
+        '''
+        partial = other._merged()
+        with self._lock:
+            self._partials.append(partial)
+
+    def dump(self, path: str) -> None:
 
-    def _update_frequencies(self,frequencies: dict[Token: int]) -> None:
         '''
-        Takes in a frequencies dict and updates the total occurences of each token in the word_frequencies dict 
+        Saves the merged statistics to path
         '''
-        for word, freq in frequencies.items():
-            self._word_frequencies[word] = self._word_frequencies.get(word, 0) + freq 
-    
-    def _update_longest_page(self, url: str, frequencies: dict[Token:int]) -> None:
+        merged = self._merged()
+        data = pickle.dumps({
+            "word_frequencies": dict(merged.word_frequencies.items()),
+            "longest_page": merged.longest_page,
+            "longest_page_url": merged.longest_page_url,
+            "ics_subdomains": dict(merged.ics_subdomains)})
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> None:
 
         '''
-        Uses the _get_total_words helper function to count the amount of words on the page, and updates the max accordingly, storing this
-        length and the relevant url.
+        Adds the statistics saved to path by dump
         '''
-        page_length = _get_total_words(frequencies)
+        with open(path, "rb") as file:
+            saved = pickle.load(file)
+        with self._lock:
+            partial = _Partial(self._new_word_frequencies())
+            self._partials.append(partial)
+        with partial.lock:
+            partial.word_frequencies.update(saved["word_frequencies"])
+            partial.ics_subdomains.update(saved["ics_subdomains"])
+            partial.update_longest_page(saved["longest_page_url"], saved["longest_page"])
 
-        if page_length > self._longest_page:
-            self._longest_page = page_length
-            self._longest_page_url = url #url will be tracked
+    def _partial(self) -> _Partial:
 
-    def _get_most_common_words(self, n = 50) -> list:
+        '''
+        Returns the calling thread's partial, creating it on the thread's first page
+        '''
+        partial = getattr(self._local, "partial", None)
+        if partial is None:
+            with self._lock:
+                partial = _Partial(self._new_word_frequencies())
+                self._partials.append(partial)
+            self._local.partial = partial
+        return partial
+
+    def _new_word_frequencies(self):
+        return Counter() if self._max_words is None else SpaceSaving(self._max_words)
+
+    def _merged(self) -> _Partial:
 
         '''
-        Takes in a threshold (default 50) and returns a list of the n most common words seen ordered. Ties are resolved alphabetically and stopwords are ignored
+        Merges every partial into a new one. Partials are locked one at a time, so workers keep adding pages meanwhile
         '''
-        sorted_freqs = sorted(self._word_frequencies.items(), key = (lambda x: (x[0] in stopwords.STOPWORDS, -x[1], x[0]))): #sorts by frequency and order ties by alphabteical order
-        ##The lamdba function returns a true or false value for the first tuple element, and the true tuples represent 
-        ##stop words, which will essentially be pushed to the end of the sort as true > false
-        
-        return sorted_freqs[:n] #checks to see if there are common stopwords and excludes such words
+        with self._lock:
+            merged = _Partial(self._new_word_frequencies())
+            partials = list(self._partials)
+        for partial in partials:
+            with partial.lock:
+                merged.merge(partial)
+        return merged
+
+    def _checkpoint(self) -> None:
+        if not self._checkpoint_lock.acquire(blocking=False):
+            return #another thread is already writing one
+        try:
+            self._last_checkpoint = self._clock()
+            self.dump(self._checkpoint_file)
+        finally:
+            self._checkpoint_lock.release()
 
     def print_report(self) -> None:
 
@@ -79,12 +207,13 @@ class Report:
         subdomains in ics.uci.edu as well as the pages they link to
         '''
         ##maybe get unqiue pages from the frontier - this would be a convenience thing
+        merged = self._merged()
         print("REPORT:")
-        print(f'The longest page in terms of words was {self._longest_page_url} with {self._longest_page} words.\n')
+        print(f'The longest page in terms of words was {merged.longest_page_url} with {merged.longest_page} words.\n')
         print("The 50 most common words (ignoring English stopwords) were:")
-        for w,f in self._get_most_common_words():
+        for w,f in _get_most_common_words(merged.word_frequencies):
             print(f'{w} --> {f}')
-        
+
         print("Subdomains in ics.uci.edu (subdomain url --> pages detected in subdomain): ")
-        for sd, freq in self._ics_subdomains.items():
+        for sd, freq in merged.ics_subdomains.items():
             print(f'{sd} --> {freq}')
@@ -1,67 +1,109 @@
-import re
-from urllib.parse import urlparse
-from lxml import html, etree
-from bs4 import BeautifulSoup
-
-# Import parse libraries.
-from bs4 import BeautifulSoup
-from lxml import html
-
-MAX_SIZE = 15_000_000
-
-def scraper(url, resp):
-
-    page_text = BeautifulSoup(resp.raw_response.content, 'html.parser')
-    print(page_text.get_text())
-    
-
-    links = extract_next_links(url, resp)
-    for link in links:
-        print(link)
-    return [link for link in links if is_valid(link)]
-
-def extract_next_links(url, resp):
-
-    
-    # Implementation required.
-    # url: the URL that was used to get the page
-    # resp.url: the actual url of the page
-    # resp.status: the status code returned by the server. 200 is OK, you got the page. Other numbers mean that there was some kind of problem.
-    # resp.error: when status is not 200, you can check the error here, if needed.
-    # resp.raw_response: this is where the page actually is. More specifically, the raw_response has two parts:
-    #         resp.raw_response.url: the url, again
-    #         resp.raw_response.content: the content of the page!
-    # Return a list with the hyperlinks (as strings) scrapped from resp.raw_response.content
-    match resp.status:
-        case 200:
-            if len(resp.raw_response.content) <= MAX_SIZE:
-                return [link[2] for link in html.iterlinks(resp.raw_response.content)]
-            return []
-        case _: return []
-
-def is_valid(url):
-    # Decide whether to crawl this url or not. 
-    # If you decide to crawl it, return True; otherwise return/admissions/undergraduate-application-process/ False.
-    # There are already some conditions that return False.
-    try:
-        parsed = urlparse(url)
-        if parsed.scheme not in set(["http", "https"]):
-            return False
-        elif not parsed.netloc.endswith((".ics.uci.edu",
-                                         ".cs.uci.edu",
-                                         ".informatics.uci.edu",
-                                         ".stat.uci.edu")):
-            return False
-        return not re.match(
-            r".*\.(css|js|bmp|gif|jpe?g|ico"
-            + r"|png|tiff?|mid|mp2|mp3|mp4"
-            + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
-            + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
-            + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
-            + r"|epub|dll|cnf|tgz|sha1"
-            + r"|thmx|mso|arff|rtf|jar|csv"
-            + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower())
-
-    except TypeError:
-        print ("TypeError for ", parsed)
-        raise
+import time
+from typing import NamedTuple
+
+from utils import url_filter
+from utils.page import parse_page
+from utils.simhash import Simhash, compute_fingerprint
+from utils.traps import TrapDetector
+from utils.tokenize import computeWordFrequencies
+from utils.metrics import metrics
+from report import Report
+
+# statistics over every page scraped, printed when the crawl ends.
+report = Report()
+# checksums and fingerprints of every page scraped, to skip duplicates.
+simhash = Simhash()
+# per host and per path template counters, to stop crawling traps.
+traps = TrapDetector()
+# if set, near duplicates of earlier pages are left out of the report and
+# their links are not followed, set from SKIPNEARDUPLICATES by the Crawler.
+skip_near_duplicates = False
+
+class PageAnalysis(NamedTuple):
+    links: list
+    frequencies: dict
+    fingerprint: int
+    parse_time: float       # seconds, measured wherever the page was analyzed
+    tokenize_time: float
+
+def scraper(url, resp):
+    content = new_content(url, resp)
+    if content is None:
+        return []
+    return record(url, analyze(resp.url or url, content))
+
+def extract_next_links(url, resp):
+    # url: the URL that was used to get the page
+    # resp.url: the actual url of the page
+    # resp.status: the status code returned by the server. 200 is OK, you got the page. Other numbers mean that there was some kind of problem.
+    # resp.error: when status is not 200, you can check the error here, if needed.
+    # resp.raw_response: this is where the page actually is. More specifically, the raw_response has two parts:
+    #         resp.raw_response.url: the url, again
+    #         resp.raw_response.content: the content of the page!
+    # Return a list with the hyperlinks (as strings) scrapped from resp.raw_response.content
+    content = response_content(resp)
+    if content is None:
+        return []
+    return parse_page(resp.url or url, content).links
+
+def response_content(resp):
+    # The page's html, or None if the response has nothing worth parsing.
+    # Pages over MAXSIZE bytes never get here, the download drops them.
+    if resp.status != 200 or resp.raw_response is None:
+        return None
+    content = resp.raw_response.content
+    if not content:
+        return None
+    return content
+
+def new_content(url, resp):
+    # Same as response_content, but also None if the exact same bytes were
+    # already scraped from another url, so that copy is never parsed. It
+    # still counts as a duplicate page of its template for trap detection.
+    content = response_content(resp)
+    if content is None:
+        return None
+    if simhash.is_exact_duplicate(content):
+        metrics.increment("dedup_exact")
+        traps.record_page(url, True)
+        return None
+    return content
+
+def analyze(base_url, content) -> PageAnalysis:
+    # The CPU bound part of scraping. It only depends on its arguments, so it
+    # can run in another process (see crawler/parse_pool.py). The page is
+    # parsed exactly once, so the text and the links come from the same tree.
+    start = time.perf_counter()
+    page = parse_page(base_url, content)
+    parsed = time.perf_counter()
+    frequencies = computeWordFrequencies(page.text)
+    tokenized = time.perf_counter()
+    return PageAnalysis(
+        page.links, frequencies, compute_fingerprint(frequencies),
+        parsed - start, tokenized - parsed)
+
+def record(url, analysis):
+    # Adds an analyzed page to the crawl wide statistics and returns the links
+    # worth crawling. Near duplicates of earlier pages count towards their
+    # template being flagged as a trap, and are skipped if skip_near_duplicates.
+    metrics.observe("parse", analysis.parse_time)
+    metrics.observe("tokenize", analysis.tokenize_time)
+    near_duplicate = simhash.find_similar(url, analysis.fingerprint) is not None
+    traps.record_page(url, near_duplicate)
+    if near_duplicate:
+        metrics.increment("dedup_near")
+        if skip_near_duplicates:
+            return []
+    report.add_page(url, analysis.frequencies)
+    return traps.filter_urls(url_filter.filter_urls(analysis.links))
+
+def is_valid(url):
+    # Decide whether to crawl this url or not. 
+    # If you decide to crawl it, return True; otherwise return False.
+    # The rules are compiled once in utils/url_filter.py, add new ones there.
+    try:
+        return url_filter.is_valid(url)
+
+    except TypeError:
+        print ("TypeError for ", url)
+        raise
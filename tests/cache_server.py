@@ -0,0 +1,120 @@
+import pickle
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from urllib.parse import urlparse, parse_qs
+
+import cbor
+import requests
+
+
+class FakeCacheServer(object):
+    '''
+    Stand-in for the cache server on 127.0.0.1, for tests and benchmarks.
+    Answers GET /?q=url&u=useragent with the cbor body the real one sends:
+    the page from pages, a dict[url, html bytes], pickled as a
+    requests.Response, or a 404 page for any other url. Every answer waits
+    latency seconds first, and connections are kept alive like the real one.
+    The bodies of urls in truncated are cut off halfway and the connection
+    closed, as when the server goes away mid download.
+    '''
+    def __init__(self, pages=None, latency=0.0, truncated=()):
+        self.pages = pages if pages is not None else dict()
+        self.latency = latency
+        self.truncated = set(truncated)
+        self.requests = list()      # (url, time.monotonic()) of every request
+        self.connections = 0        # tcp connections accepted
+        self.lock = Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def address(self):
+        '''(host, port) to set as config.cache_server.'''
+        return self.server.server_address[:2]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def body(self, url):
+        '''The cbor body answering url.'''
+        content = self.pages.get(url)
+        page = requests.Response()
+        page.url = url
+        page.status_code = 200 if content is not None else 404
+        page.headers["Content-Type"] = "text/html; charset=utf-8"
+        page._content = content if content is not None else b"<html>Not Found</html>"
+        return cbor.dumps({
+            "url": url, "status": page.status_code, "response": pickle.dumps(page)})
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # keep-alive
+            # headers and body are written apart, which Nagle's algorithm
+            # would hold back until the client's delayed ack.
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with server.lock:
+                    server.connections += 1
+
+            def do_GET(self):
+                url = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+                with server.lock:
+                    server.requests.append((url, time.monotonic()))
+                if server.latency:
+                    time.sleep(server.latency)
+                body = server.body(url)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if url in server.truncated:
+                    self.wfile.write(body[:len(body) // 2])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def make_site(hosts, pages_per_host, links_per_page=10, words_per_page=300):
+    '''
+    A synthetic crawlable site: dict[url, html bytes] of pages_per_host pages
+    on each of hosts subdomains of ics.uci.edu, every page linking to
+    links_per_page others across the hosts, so every page is reachable from
+    the first page of each host.
+    '''
+    urls = [
+        f"http://h{host}.ics.uci.edu/page/{page}"
+        for host in range(hosts) for page in range(pages_per_host)]
+    pages = dict()
+    for i, url in enumerate(urls):
+        links = "".join(
+            f'<a href="{urls[(i * 7 + j * 13 + 1) % len(urls)]}">link {j}</a>'
+            for j in range(links_per_page))
+        text = " ".join(f"word{(i * 31 + j) % 5000}" for j in range(words_per_page))
+        pages[url] = (
+            f"<html><head><title>Page {i}</title></head>"
+            f"<body><p>{text}</p>{links}</body></html>").encode()
+    return pages
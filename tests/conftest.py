@@ -0,0 +1,16 @@
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def config(tmp_path):
+    '''A utils.config.Config stand-in, saving under tmp_path.'''
+    return SimpleNamespace(
+        user_agent="test", threads_count=1, engine="threads", save_file=str(tmp_path / "frontier.shelve"),
+        commit_batch=1000, commit_interval=1.0, seed_urls=[], time_delay=0.3,
+        robots_ttl=24 * 60 * 60, sitemaps=False, host_budget=0, host_window=0,
+        skip_near_duplicates=False, max_size=15_000_000, cache_server=None,
+        timeout=5, retries=0, backoff=0.0, pool_size=4, concurrency=10,
+        report_words=0, report_interval=60, metrics_interval=60, metrics_port=0,
+        parse_processes=0, parse_queue=0)
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+import scraper
+from crawler import Crawler
+from report import Report
+from utils.simhash import Simhash
+from utils.traps import TrapDetector
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(scraper, "report", Report())
+    monkeypatch.setattr(scraper, "simhash", Simhash())
+    monkeypatch.setattr(scraper, "traps", TrapDetector())
+
+
+def save_sidecars(config):
+    '''Save a page checksum, trap counters and a report next to the save file.'''
+    simhash = Simhash()
+    simhash.is_exact_duplicate(b"<html>seed</html>")
+    simhash.dump(f"{config.save_file}.simhash")
+    TrapDetector().dump(f"{config.save_file}.traps")
+    report = Report()
+    report.add_page("http://www.ics.uci.edu/", {"seed": 1})
+    report.dump(f"{config.save_file}.report")
+
+
+def test_sidecars_are_dropped_with_the_save_file(config):
+    crawler = Crawler(config, restart=False)
+    crawler.frontier.close()
+    save_sidecars(config)
+    # deleting the save file starts the crawl over, sidecars included.
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(config.save_file + suffix):
+            os.remove(config.save_file + suffix)
+
+    crawler = Crawler(config, restart=False)
+    crawler.frontier.close()
+    assert not crawler.frontier.resumed
+    assert not scraper.simhash.is_exact_duplicate(b"<html>seed</html>")
+    for suffix in (".simhash", ".traps", ".report"):
+        assert not os.path.exists(config.save_file + suffix)
+
+
+def test_sidecars_are_loaded_on_resume(config):
+    crawler = Crawler(config, restart=False)
+    crawler.frontier.close()
+    save_sidecars(config)
+
+    crawler = Crawler(config, restart=False)
+    crawler.frontier.close()
+    assert crawler.frontier.resumed
+    assert scraper.simhash.is_exact_duplicate(b"<html>seed</html>")
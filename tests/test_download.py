@@ -0,0 +1,37 @@
+import pytest
+
+import utils.download
+from utils.download import download
+from utils.response import STATUS_FAILED
+from tests.cache_server import FakeCacheServer
+
+
+@pytest.fixture(autouse=True)
+def fresh_session(monkeypatch):
+    '''A session of its own for every test, pooling connections to its server.'''
+    monkeypatch.setattr(utils.download, "_session", None)
+
+
+PAGE = b"<html><body>" + b"x" * 10000 + b"</body></html>"
+
+
+def test_downloads_reuse_connections(config):
+    urls = [f"http://www.ics.uci.edu/p/{i}" for i in range(20)]
+    with FakeCacheServer({url: PAGE for url in urls}) as server:
+        config.cache_server = server.address
+        for url in urls:
+            resp = download(url, config)
+            assert resp.status == 200
+            assert resp.raw_response.content == PAGE
+        assert server.connections == 1
+
+
+def test_connection_lost_mid_body_fails_the_download(config):
+    url = "http://www.ics.uci.edu/broken"
+    with FakeCacheServer({url: PAGE}, truncated=[url]) as server:
+        config.cache_server = server.address
+        resp = download(url, config)
+        assert resp.status == STATUS_FAILED
+        assert resp.raw_response is None
+        # the next download gets a connection of its own.
+        assert download("http://www.ics.uci.edu/missing", config).status == 404
@@ -0,0 +1,230 @@
+import heapq
+import math
+import time
+from threading import Barrier, Event, Thread
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+import pytest
+
+import utils.robots
+import utils.sitemap
+from utils.robots import ALLOW_ALL
+from crawler.frontier import Frontier
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def fake_download(url, config, logger=None, *args, **kwargs):
+    '''Every host has no robots.txt.'''
+    return SimpleNamespace(status=404, raw_response=None)
+
+
+def crawl(frontier, clock, hosts, workers, latency):
+    '''
+    Crawl every queued url with the given number of workers, each download
+    taking latency seconds. Returns (netloc, start, end) of every download.
+    '''
+    for netloc in hosts:
+        frontier.robots.fetch("http", netloc)
+    frontier.add_urls([f"http://{netloc}/p/{i}" for netloc in hosts for i in range(5)])
+    downloads = list()
+    running = list()    # heap of (end, start, url)
+    while True:
+        wait = math.inf     # until a worker is free
+        while len(running) < workers:
+            url, wait = frontier.poll_tbd_url()
+            if url is None:
+                break
+            heapq.heappush(running, (clock.now + latency, clock.now, url))
+        if wait is None and not running:
+            return downloads
+        clock.now = min(
+            running[0][0] if running else math.inf,
+            clock.now + wait if wait is not None else math.inf)
+        while running and running[0][0] <= clock.now:
+            end, start, url = heapq.heappop(running)
+            downloads.append((urlparse(url).netloc, start, end))
+            frontier.mark_url_complete(url)
+
+
+@pytest.mark.parametrize("workers, latency", [(4, 0.01), (4, 1.0), (1, 0.0)])
+def test_politeness_counts_from_completion(config, monkeypatch, workers, latency):
+    monkeypatch.setattr(utils.robots, "download", fake_download)
+    clock = FakeClock()
+    frontier = Frontier(config, restart=True, clock=clock)
+    hosts = ["a.ics.uci.edu", "b.ics.uci.edu"]
+    try:
+        downloads = crawl(frontier, clock, hosts, workers, latency)
+    finally:
+        frontier.close()
+
+    assert len(downloads) == 5 * len(hosts)
+    for netloc in hosts:
+        host_downloads = sorted(
+            (start, end) for host, start, end in downloads if host == netloc)
+        for (_, previous_end), (start, _) in zip(host_downloads, host_downloads[1:]):
+            # never two in flight at once, and the delay starts once the last one is done.
+            assert start - previous_end >= config.time_delay - 1e-9
+
+
+def test_host_slot_waits_for_the_host(config, monkeypatch):
+    monkeypatch.setattr(utils.robots, "download", fake_download)
+    clock = FakeClock()
+    frontier = Frontier(config, restart=True, clock=clock)
+    netloc = "a.ics.uci.edu"
+    frontier.robots.fetch("http", netloc)
+    frontier.add_urls([f"http://{netloc}/p/1", f"http://{netloc}/p/2"])
+    entered, done = Event(), Event()
+
+    def fetch_robots():
+        with frontier.host_slot(netloc):
+            entered.set()
+            done.wait()
+
+    try:
+        url, _ = frontier.poll_tbd_url()
+        thread = Thread(target=fetch_robots)
+        thread.start()
+        # not while a page of the host is being downloaded,
+        assert not entered.wait(0.1)
+        clock.now = 1.0
+        frontier.mark_url_complete(url)
+        # nor before its politeness delay is over.
+        assert not entered.wait(0.1)
+        clock.now = 1.0 + config.time_delay
+        assert entered.wait(5)
+        # workers leave the host alone meanwhile,
+        assert frontier.poll_tbd_url() == (None, math.inf)
+        clock.now = 2.0
+        done.set()
+        thread.join()
+        # and wait for the delay after it.
+        assert frontier.poll_tbd_url() == (None, pytest.approx(config.time_delay))
+        clock.now = 2.0 + config.time_delay
+        assert frontier.poll_tbd_url() == (f"http://{netloc}/p/2", 0)
+    finally:
+        done.set()
+        frontier.close()
+
+
+def test_robots_failure_is_cached(config, monkeypatch):
+    def failing_download(url, *args, **kwargs):
+        fetches.append(url)
+        raise ConnectionError(url)
+
+    fetches = list()
+    monkeypatch.setattr(utils.robots, "download", failing_download)
+    frontier = Frontier(config, restart=True, clock=FakeClock())
+    frontier.add_urls(["http://a.ics.uci.edu/p/1"])
+    frontier.robots_fetcher.shutdown()
+    try:
+        assert frontier.robots.lookup("a.ics.uci.edu") is ALLOW_ALL
+        frontier.add_urls(["http://a.ics.uci.edu/p/2"])
+        assert fetches == ["http://a.ics.uci.edu/robots.txt"]
+        assert frontier.queued_count() == 2
+    finally:
+        frontier.close()
+
+
+def test_sitemaps_wait_for_the_host(config, monkeypatch):
+    sitemap = (
+        b'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        b'<url><loc>http://a.ics.uci.edu/p/1</loc></url></urlset>')
+    fetched = Event()
+
+    def sitemap_download(url, *args, **kwargs):
+        fetches.append((url, clock.now))
+        fetched.set()
+        return SimpleNamespace(status=200, raw_response=SimpleNamespace(content=sitemap))
+
+    fetches = list()
+    monkeypatch.setattr(utils.robots, "download", fake_download)
+    monkeypatch.setattr(utils.sitemap, "download", sitemap_download)
+    config.sitemaps = True
+    clock = FakeClock()
+    frontier = Frontier(config, restart=True, clock=clock)
+    frontier.robots.fetch("http", "a.ics.uci.edu")
+    frontier.add_urls(["http://a.ics.uci.edu/p/0"])
+    config.seed_urls = ["http://a.ics.uci.edu/p/0"]
+    try:
+        url, _ = frontier.poll_tbd_url()
+        frontier.add_seed_sitemaps()
+        assert not fetched.wait(0.1)
+        # the crawl is not over while the seed sitemaps are read.
+        assert frontier.poll_tbd_url() == (None, math.inf)
+        clock.now = 1.0
+        frontier.mark_url_complete(url)
+        assert not fetched.wait(0.1)
+        clock.now = 1.0 + config.time_delay
+        assert fetched.wait(5)
+        frontier.sitemap_fetcher.shutdown()
+        assert fetches == [("http://a.ics.uci.edu/sitemap.xml", clock.now)]
+        assert frontier.poll_tbd_url() == (None, pytest.approx(config.time_delay))
+        clock.now += config.time_delay
+        assert frontier.poll_tbd_url() == ("http://a.ics.uci.edu/p/1", 0)
+    finally:
+        frontier.close()
+
+    # a resumed crawl does not read them again.
+    frontier = Frontier(config, restart=False, clock=clock)
+    try:
+        frontier.add_seed_sitemaps()
+        assert frontier.sitemap_fetches == 0
+    finally:
+        frontier.close()
+
+
+def test_sitemaps_do_not_hold_up_robots(config, monkeypatch):
+    monkeypatch.setattr(utils.robots, "download", fake_download)
+    monkeypatch.setattr(utils.sitemap, "download", fake_download)
+    config.sitemaps = True
+    clock = FakeClock()
+    frontier = Frontier(config, restart=True, clock=clock)
+    frontier.robots.fetch("http", "a.ics.uci.edu")
+    frontier.add_urls(["http://a.ics.uci.edu/p/0"])
+    config.seed_urls = ["http://a.ics.uci.edu/p/0"]
+    try:
+        url, _ = frontier.poll_tbd_url()
+        # waits for the page of a.ics.uci.edu in flight,
+        frontier.add_seed_sitemaps()
+        # while the robots.txt of another host is fetched.
+        frontier.add_urls(["http://b.ics.uci.edu/p/0"])
+        deadline = time.monotonic() + 5
+        while frontier.robots.lookup("b.ics.uci.edu") is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert frontier.robots.lookup("b.ics.uci.edu") is ALLOW_ALL
+    finally:
+        frontier.mark_url_complete(url)
+        # lets the sitemap download through.
+        clock.now += 1.0
+        frontier.close()
+
+
+def test_asyncio_engine_fetches_robots_concurrently(config, monkeypatch):
+    config.engine = "asyncio"
+    barrier = Barrier(2, timeout=5)
+    met = list()
+
+    def download_together(url, config, logger=None, *args, **kwargs):
+        # only returns once the other host's robots.txt is being fetched too.
+        barrier.wait()
+        met.append(url)
+        return fake_download(url, config)
+
+    monkeypatch.setattr(utils.robots, "download", download_together)
+    frontier = Frontier(config, restart=True, clock=FakeClock())
+    try:
+        frontier.add_urls(["http://a.ics.uci.edu/p/0", "http://b.ics.uci.edu/p/0"])
+        deadline = time.monotonic() + 5
+        while frontier.parked and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(met) == 2
+    finally:
+        frontier.close()
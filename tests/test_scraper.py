@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+import pytest
+
+import scraper
+from report import Report
+from utils.simhash import Simhash
+from utils.traps import TrapDetector
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    '''Crawl wide state of its own for every test.'''
+    monkeypatch.setattr(scraper, "report", Report())
+    monkeypatch.setattr(scraper, "simhash", Simhash())
+    monkeypatch.setattr(scraper, "traps", TrapDetector())
+
+
+def page(text, link):
+    return f"<html><body><p>{text}</p><a href='{link}'>next</a></body></html>".encode()
+
+
+TEXT = " ".join(f"word{i}" for i in range(200))
+
+
+@pytest.mark.parametrize("skip, followed", [(False, True), (True, False)])
+def test_near_duplicates_are_only_skipped_if_asked(monkeypatch, skip, followed):
+    monkeypatch.setattr(scraper, "skip_near_duplicates", skip)
+    first = scraper.analyze(
+        "http://www.ics.uci.edu/a", page(TEXT, "http://www.ics.uci.edu/b"))
+    assert scraper.record("http://www.ics.uci.edu/a", first) == ["http://www.ics.uci.edu/b"]
+    second = scraper.analyze(
+        "http://www.ics.uci.edu/c", page(TEXT + " extra", "http://www.ics.uci.edu/d"))
+    links = scraper.record("http://www.ics.uci.edu/c", second)
+    assert (links == ["http://www.ics.uci.edu/d"]) == followed
+
+
+def test_exact_duplicates_count_towards_traps():
+    content = page(TEXT, "http://www.ics.uci.edu/next")
+    response = SimpleNamespace(
+        status=200, url=None, raw_response=SimpleNamespace(content=content))
+    urls = [f"http://www.ics.uci.edu/calendar/{day}" for day in range(20)]
+    assert scraper.scraper(urls[0], response) == ["http://www.ics.uci.edu/next"]
+    for url in urls[1:]:
+        assert scraper.scraper(url, response) == []
+    assert scraper.traps.is_blocked("http://www.ics.uci.edu/calendar/99")
@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+from utils.simhash import NUM_BITS, TOKEN_CHUNK, compute_fingerprint, compute_fingerprints, token_hash
+
+
+def reference_fingerprint(freqs):
+    '''Simhash one bit at a time: bit i is set if the tokens with bit i set in their hash outweigh the others.'''
+    fingerprint = 0
+    for i in range(NUM_BITS):
+        weight = sum(
+            freq if token_hash(token) >> i & 1 else -freq for token, freq in freqs.items())
+        if weight > 0:
+            fingerprint |= 1 << i
+    return fingerprint
+
+
+def random_page(rng, tokens):
+    return {f"token{rng.randrange(50_000)}": rng.randrange(1, 20) for _ in range(tokens)}
+
+
+def test_fingerprint_is_stable():
+    # the same in every process and run, so saved fingerprints stay comparable.
+    freqs = {"informatics": 3, "computer": 2, "science": 2, "uci": 1, "irvine": 1}
+    assert compute_fingerprint(freqs) == 0xbdac20ad4f1a80d1
+
+
+@pytest.mark.parametrize("tokens", [0, 1, 7, 1000, TOKEN_CHUNK + 123])
+def test_fingerprint_matches_the_reference(tokens):
+    rng = random.Random(tokens)
+    for _ in range(3):
+        freqs = random_page(rng, tokens)
+        assert compute_fingerprint(freqs) == reference_fingerprint(freqs)
+
+
+def test_fingerprints_of_many_pages_match_the_reference():
+    rng = random.Random(0)
+    # pages straddle the chunks, and some have no tokens at all.
+    pages = [random_page(rng, rng.choice([0, 5, 300, TOKEN_CHUNK // 3])) for _ in range(20)]
+    assert compute_fingerprints(pages) == [reference_fingerprint(freqs) for freqs in pages]
@@ -0,0 +1,86 @@
+import time
+
+import crawler.store
+from crawler.store import FrontierStore
+
+
+def test_iterates_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(crawler.store, "READ_BATCH", 3)
+    # every write is committed right away, between the batches read.
+    store = FrontierStore(str(tmp_path / "frontier.shelve"), batch_size=1)
+    urls = {f"hash{i}": f"http://h{i % 2}.ics.uci.edu/p/{i}" for i in range(10)}
+    for i, (urlhash, url) in enumerate(urls.items()):
+        store[urlhash] = (url, i % 3 == 0, 1)
+    try:
+        assert sorted(store.hashes()) == sorted(urls)
+        assert dict(store.items()) == {
+            urlhash: (url, i % 3 == 0, 1) for i, (urlhash, url) in enumerate(urls.items())}
+        pending = list()
+        for netloc, url, depth in store.to_be_downloaded():
+            pending.append(url)
+            # the store can be written to between batches, as when the frontier spills.
+            store.spill([(url, url, depth, 0.0)])
+        assert sorted(pending) == sorted(
+            url for i, url in enumerate(urls.values()) if i % 3 != 0)
+    finally:
+        store.close()
+
+
+def test_commits_once_the_interval_is_due(tmp_path):
+    store = FrontierStore(str(tmp_path / "frontier.shelve"), interval=0.5)
+    try:
+        store["hash"] = ("http://www.ics.uci.edu/", True, 0)
+        assert store.buffer
+        # no other write comes along to commit it.
+        deadline = time.monotonic() + 5
+        while store.buffer and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not store.buffer
+        assert store.commits == 1
+    finally:
+        store.close()
+
+
+def test_interval_of_zero_only_commits_full_batches(tmp_path):
+    store = FrontierStore(str(tmp_path / "frontier.shelve"), batch_size=3, interval=0)
+    try:
+        store["hash0"] = ("http://www.ics.uci.edu/0", False, 0)
+        store["hash1"] = ("http://www.ics.uci.edu/1", False, 0)
+        assert len(store.buffer) == 2 and store.commits == 0
+        store["hash2"] = ("http://www.ics.uci.edu/2", False, 0)
+        assert not store.buffer and store.commits == 1
+    finally:
+        store.close()
+
+
+def test_counts_per_host_without_scanning(tmp_path):
+    path = str(tmp_path / "frontier.shelve")
+    store = FrontierStore(path, batch_size=1)
+    try:
+        for i in range(9):
+            store[f"hash{i}"] = (f"http://h{i % 3}.ics.uci.edu/p/{i}", False, 0)
+        for i in range(0, 9, 2):
+            store[f"hash{i}"] = (f"http://h{i % 3}.ics.uci.edu/p/{i}", True, 0)
+        store.spill([("hash1", "http://h1.ics.uci.edu/p/1", 0, 1.0)])
+        store.refilter(lambda url: not url.endswith("/7"))
+        expected = {"h0.ics.uci.edu": 2, "h1.ics.uci.edu": 1, "h2.ics.uci.edu": 2}
+        assert store.completed_per_host() == expected
+        assert store.spilled_per_host() == {"h1.ics.uci.edu": 1}
+        assert sorted(url for _, url, _ in store.to_be_downloaded()) == [
+            "http://h0.ics.uci.edu/p/3", "http://h2.ics.uci.edu/p/5"]
+        assert len(store) == 9
+        plan = store.db.execute(
+            "EXPLAIN QUERY PLAN SELECT rowid, url, depth FROM urls "
+            "WHERE rowid > 0 AND netloc = 'h0.ics.uci.edu' AND state = 0 "
+            "ORDER BY rowid LIMIT 10").fetchall()
+        assert "USING INDEX to_be_downloaded" in plan[0][-1]
+        # a store saved before the counts were kept is counted when opened.
+        store.db.execute("DROP TABLE counts")
+    finally:
+        store.close()
+    store = FrontierStore(path)
+    try:
+        assert store.completed_per_host() == expected
+        assert len(store) == 9
+    finally:
+        store.close()
@@ -0,0 +1,51 @@
+import random
+import re
+from collections import defaultdict
+
+import pytest
+
+from utils.stopwords import STOPWORDS
+from utils.tokenize import computeWordFrequencies, computeWordFrequenciesStream
+
+
+def baseline_frequencies(text):
+    '''The tokenizer computeWordFrequencies replaced, line by line and token by token.'''
+    frequencies = defaultdict(int)
+    for line in text.split('\n'):
+        for token in re.split(r'[^a-zA-Z0-9]', line):
+            if token.isalnum():
+                frequencies[token.lower()] += 1
+    return frequencies
+
+
+# ascii letters and digits, separators, and non ascii chars, some lowercasing to a-z.
+ALPHABET = (
+    "aBcXyZ019" + " \n\t.,-_'\"/" + "éßİKÅKİŉ漢字😀 ")
+
+
+def random_texts(count=2000, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield "".join(rng.choice(ALPHABET) for _ in range(rng.randrange(200)))
+
+
+def random_chunks(text, rng):
+    cuts = sorted(rng.randrange(len(text) + 1) for _ in range(rng.randrange(5)))
+    return [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+
+def test_matches_baseline():
+    rng = random.Random(1)
+    for text in random_texts():
+        expected = dict(baseline_frequencies(text))
+        assert dict(computeWordFrequencies(text)) == expected
+        assert dict(computeWordFrequenciesStream(random_chunks(text, rng))) == expected
+
+
+@pytest.mark.parametrize("text", ["The cat and the hat", "THE a an", "Kelvin is not kelvin"])
+def test_skip_stopwords(text):
+    expected = {
+        token: count for token, count in baseline_frequencies(text).items()
+        if token not in STOPWORDS}
+    assert dict(computeWordFrequencies(text, skip_stopwords=True)) == expected
+    assert dict(computeWordFrequenciesStream([text], skip_stopwords=True)) == expected
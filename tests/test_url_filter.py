@@ -0,0 +1,38 @@
+from urllib.parse import urlparse
+
+import pytest
+
+from utils import url_filter
+
+
+@pytest.mark.parametrize("url", [
+    "https://www.ics.uci.edu/about/index.php?id=3#top",
+    "HTTP://www.ics.uci.edu/a;b/c;d?x=1#f",
+    "http://www.ics.uci.edu/p;jsessionid=1",
+    "http://user:pw@www.ics.uci.edu:80/",
+    "http://www.ics.uci.edu",
+    "https://www.ics.uci.edu?x",
+    "http:www.ics.uci.edu",
+    "//www.ics.uci.edu/p",
+    "/relative/path?q",
+    "mailto:someone@ics.uci.edu",
+    "javascript:void(0)",
+    "1http://www.ics.uci.edu/",
+    "h ttp://www.ics.uci.edu/",
+    " http://www.ics.uci.edu/ ",
+    "http://www.ics.uci.edu/\tp",
+    "http://www.ics.uci.edu/é",
+    "",
+])
+def test_parse_matches_urlparse(url):
+    assert url_filter.parse(url) == urlparse(url)._replace(fragment="")
+
+
+@pytest.mark.parametrize("path, repeated", [
+    ("/a/b/c/d/", False),
+    ("/a/b/a/b/", False),
+    ("/a/b/a/b/a/", True),
+    ("//a//b//", False),
+])
+def test_repeated_segments(path, repeated):
+    assert url_filter._has_repeated_segment(path.split("/")) == repeated
@@ -3,9 +3,14 @@ import logging
 from hashlib import sha256
 from urllib.parse import urlparse
 
+from utils.canonical import canonicalize
+
 def get_logger(name, filename=None):
     logger = logging.getLogger(name)
     logger.setLevel(logging.INFO)
+    if logger.handlers:
+        # already set up by an earlier call, more handlers would repeat every line.
+        return logger
     if not os.path.exists("Logs"):
         os.makedirs("Logs")
     fh = logging.FileHandler(f"Logs/{filename if filename else name}.log")
@@ -23,13 +28,13 @@ def get_logger(name, filename=None):
 
 
 def get_urlhash(url):
-    parsed = urlparse(url)
+    # every spelling of the same page hashes the same, see utils/canonical.py.
+    parsed = urlparse(canonicalize(url))
     # everything other than scheme.
     return sha256(
         f"{parsed.netloc}/{parsed.path}/{parsed.params}/"
         f"{parsed.query}/{parsed.fragment}".encode("utf-8")).hexdigest()
 
 def normalize(url):
-    if url.endswith("/"):
-        return url.rstrip("/")
-    return url
+    # canonical form, which also strips trailing slashes.
+    return canonicalize(url)
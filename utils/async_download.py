@@ -0,0 +1,51 @@
+import asyncio
+
+import aiohttp
+
+from utils.corpus import get_replaying
+from utils.download import (
+    CHUNK_SIZE, RETRY_STATUSES, decode_response, failed_response, skipped_response,
+    record_response, replay_response)
+
+
+def create_session(config):
+    '''Returns a keep-alive session to the cache server for download_async.'''
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=config.concurrency),
+        timeout=aiohttp.ClientTimeout(total=config.timeout))
+
+
+async def download_async(session, url, config, logger=None, content_types=None):
+    '''
+    Same as utils.download.download, for the asyncio engine. Transient cache
+    server errors are retried with the same exponential backoff.
+    '''
+    if get_replaying() is not None:
+        return replay_response(url, config, content_types, logger)
+    host, port = config.cache_server
+    for attempt in range(config.retries + 1):
+        retry_in = config.backoff * 2 ** attempt
+        try:
+            async with session.get(
+                    f"http://{host}:{port}/",
+                    params=[("q", f"{url}"), ("u", f"{config.user_agent}")]) as resp:
+                if resp.status in RETRY_STATUSES and attempt < config.retries:
+                    await asyncio.sleep(retry_in)
+                    continue
+                length = resp.content_length
+                if length is not None and length > config.max_size:
+                    record_response(url, resp.status, None)
+                    return skipped_response(url, f"Content-Length {length} is over {config.max_size} bytes", logger)
+                body = bytearray()
+                async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                    body += chunk
+                    if len(body) > config.max_size:
+                        record_response(url, resp.status, None)
+                        return skipped_response(url, f"Body is over {config.max_size} bytes", logger)
+                body = bytes(body)
+                record_response(url, resp.status, body)
+                return decode_response(url, resp.status, body, content_types, logger)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt == config.retries:
+                return failed_response(url, e, logger)
+            await asyncio.sleep(retry_in)
@@ -0,0 +1,95 @@
+import re
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit
+
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+# query parameters that only track where a click came from, never change the page.
+TRACKING_PARAMETERS = frozenset((
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "mc_cid", "mc_eid",
+    "_ga", "_gl", "igshid", "ref_src"))
+TRACKING_PREFIXES = ("utm_",)
+
+# characters that never need percent encoding, RFC 3986 section 2.3
+UNRESERVED = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+PERCENT_ESCAPE = re.compile(r"%([0-9A-Fa-f]{2})")
+
+CACHE_SIZE = 2**16
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def canonicalize(url: str) -> str:
+    '''
+    Returns the canonical form of url, the same for every spelling of the same page:
+    lowercase scheme and host, no default port, no dot segments or trailing slash
+    in the path, normalized percent escapes, query parameters sorted without the
+    tracking ones, and no fragment. Urls that cannot be parsed are returned as is.
+    '''
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+
+    netloc = (parts.hostname or "").rstrip(".")
+    if ":" in netloc:
+        netloc = f"[{netloc}]"  # ipv6 address
+    if port is not None and str(port) != DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{port}"
+    if parts.username is not None:
+        userinfo = parts.username
+        if parts.password is not None:
+            userinfo += f":{parts.password}"
+        netloc = f"{userinfo}@{netloc}"
+
+    path = _remove_dot_segments(_normalize_escapes(parts.path)).rstrip("/")
+
+    query = "&".join(sorted(
+        _normalize_escapes(parameter) for parameter in parts.query.split("&")
+        if parameter and not _is_tracking(parameter)))
+
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def cache_info():
+    '''Hits and misses of the canonicalize cache.'''
+    return canonicalize.cache_info()
+
+
+def _is_tracking(parameter: str) -> bool:
+    key = parameter.split("=", 1)[0].lower()
+    return key in TRACKING_PARAMETERS or key.startswith(TRACKING_PREFIXES)
+
+
+def _normalize_escapes(text: str) -> str:
+    '''Decodes escaped unreserved characters and uppercases the other escapes.'''
+    if "%" not in text:
+        return text
+    return PERCENT_ESCAPE.sub(_normalize_escape, text)
+
+
+def _normalize_escape(match: re.Match) -> str:
+    char = chr(int(match.group(1), 16))
+    return char if char in UNRESERVED else match.group(0).upper()
+
+
+def _remove_dot_segments(path: str) -> str:
+    '''Resolves "." and ".." path segments, RFC 3986 section 5.2.4.'''
+    if "." not in path:
+        return path
+    segments = path.split("/")
+    output = list()
+    for segment in segments:
+        if segment == ".":
+            continue
+        if segment == "..":
+            if len(output) > 1:
+                output.pop()
+            continue
+        output.append(segment)
+    if segments[-1] in (".", ".."):
+        # the path still names a directory
+        output.append("")
+    return "/".join(output)
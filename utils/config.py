@@ -1,3 +1,4 @@
+import os
 import re
 
 
@@ -8,12 +9,34 @@ class Config(object):
         assert self.user_agent != "DEFAULT AGENT", "Set useragent in config.ini"
         assert re.match(r"^[a-zA-Z0-9_ ,]+$", self.user_agent), "User agent should not have any special characters outside '_', ',' and 'space'"
         self.threads_count = int(config["LOCAL PROPERTIES"]["THREADCOUNT"])
+        self.engine = config["LOCAL PROPERTIES"].get("ENGINE", "threads")
+        assert self.engine in ("threads", "asyncio"), "ENGINE should be either threads or asyncio"
+        self.concurrency = int(config["LOCAL PROPERTIES"].get("CONCURRENCY", 100))
+        self.parsers = int(config["LOCAL PROPERTIES"].get("PARSERS", os.cpu_count()))
+        self.parse_processes = int(config["LOCAL PROPERTIES"].get("PARSEPROCESSES", 0))
+        self.parse_queue = int(config["LOCAL PROPERTIES"].get("PARSEQUEUE", 2 * self.parse_processes))
         self.save_file = config["LOCAL PROPERTIES"]["SAVE"]
+        self.commit_batch = int(config["LOCAL PROPERTIES"].get("COMMITBATCH", 1000))
+        self.commit_interval = float(config["LOCAL PROPERTIES"].get("COMMITINTERVAL", 1.0))
+        self.report_interval = float(config["LOCAL PROPERTIES"].get("REPORTINTERVAL", 60))
+        self.report_words = int(config["LOCAL PROPERTIES"].get("REPORTWORDS", 0))
+        self.metrics_interval = float(config["LOCAL PROPERTIES"].get("METRICSINTERVAL", 10))
+        self.metrics_port = int(config["LOCAL PROPERTIES"].get("METRICSPORT", 0))
 
         self.host = config["CONNECTION"]["HOST"]
         self.port = int(config["CONNECTION"]["PORT"])
+        self.pool_size = int(config["CONNECTION"].get("POOLSIZE", self.threads_count))
+        self.timeout = float(config["CONNECTION"].get("TIMEOUT", 30))
+        self.retries = int(config["CONNECTION"].get("RETRIES", 3))
+        self.backoff = float(config["CONNECTION"].get("BACKOFF", 0.5))
 
         self.seed_urls = config["CRAWLER"]["SEEDURL"].split(",")
         self.time_delay = float(config["CRAWLER"]["POLITENESS"])
+        self.max_size = int(config["CRAWLER"].get("MAXSIZE", 15_000_000))
+        self.robots_ttl = float(config["CRAWLER"].get("ROBOTSTTL", 24 * 60 * 60))
+        self.sitemaps = config["CRAWLER"].getboolean("SITEMAPS", True)
+        self.host_budget = int(config["CRAWLER"].get("HOSTBUDGET", 1000))
+        self.host_window = int(config["CRAWLER"].get("HOSTWINDOW", 1000))
+        self.skip_near_duplicates = config["CRAWLER"].getboolean("SKIPNEARDUPLICATES", False)
 
         self.cache_server = None
\ No newline at end of file
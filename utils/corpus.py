@@ -0,0 +1,93 @@
+import sqlite3
+import zlib
+
+from threading import Lock
+
+
+# the corpus being recorded to or replayed from, see record_to and replay_from.
+_recording = None
+_replaying = None
+
+
+class Corpus(object):
+    '''
+    The cache server's responses, keyed by url, in a SQLite file. Bodies are
+    kept exactly as the cache server sent them, zlib compressed, so a replay
+    decodes them the same way a crawl does. A body of None marks a response
+    skipped for being over the size limit.
+    '''
+    def __init__(self, path, batch_size=100):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = 0    # writes not yet committed
+        self.lock = Lock()
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "url TEXT PRIMARY KEY, status INTEGER NOT NULL, body BLOB)")
+
+    def record(self, url, status, body):
+        compressed = zlib.compress(body) if body is not None else None
+        with self.lock:
+            if not self.pending:
+                self.db.execute("BEGIN")
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                (url, status, compressed))
+            self.pending += 1
+            if self.pending >= self.batch_size:
+                self.db.execute("COMMIT")
+                self.pending = 0
+
+    def lookup(self, url):
+        '''Returns (status, body) as recorded for url, or None if it was not.'''
+        with self.lock:
+            row = self.db.execute(
+                "SELECT status, body FROM responses WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        status, compressed = row
+        return status, zlib.decompress(compressed) if compressed is not None else None
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            if self.pending:
+                self.db.execute("COMMIT")
+                self.pending = 0
+            self.db.close()
+
+
+def record_to(path):
+    '''Records every response downloaded from now on to the corpus at path.'''
+    global _recording
+    _recording = Corpus(path)
+    return _recording
+
+
+def replay_from(path):
+    '''Serves every download from now on from the corpus at path, without the cache server.'''
+    global _replaying
+    _replaying = Corpus(path)
+    return _replaying
+
+
+def get_recording():
+    return _recording
+
+
+def get_replaying():
+    return _replaying
+
+
+def close_corpus():
+    '''Commits and closes the corpus being recorded or replayed, if any.'''
+    global _recording, _replaying
+    for corpus in (_recording, _replaying):
+        if corpus is not None:
+            corpus.close()
+    _recording = _replaying = None
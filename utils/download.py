@@ -2,20 +2,127 @@ import requests
 import cbor
 import time
 
-from utils.response import Response
+from threading import Lock
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-def download(url, config, logger=None):
+from utils.response import Response, STATUS_SKIPPED, STATUS_FAILED
+from utils.corpus import get_recording, get_replaying
+
+CHUNK_SIZE = 64 * 1024
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+RETRY_STATUSES = (500, 502, 503, 504)   # transient cache server errors
+
+# one pooled keep-alive session to the cache server, shared by every worker.
+_session = None
+_session_lock = Lock()
+
+def get_session(config):
+    '''Returns the shared session, creating it from config on first use.'''
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=config.retries, backoff_factor=config.backoff,
+                status_forcelist=RETRY_STATUSES, allowed_methods=("GET",),
+                raise_on_status=False)
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=config.pool_size,
+                max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+def download(url, config, logger=None, content_types=None):
+    '''
+    Streams the cache server's response, giving up as soon as it is known to
+    be larger than config.max_size. If content_types is given, a page whose
+    Content-Type is not one of them is skipped as well. Skipped downloads
+    return a Response with status STATUS_SKIPPED and no raw_response.
+    Responses are recorded to, or replayed from, the corpus if one is set,
+    see utils/corpus.py.
+    '''
+    if get_replaying() is not None:
+        return replay_response(url, config, content_types, logger)
     host, port = config.cache_server
-    resp = requests.get(
-        f"http://{host}:{port}/",
-        params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
     try:
-        if resp and resp.content:
-            return Response(cbor.loads(resp.content))
+        resp = get_session(config).get(
+            f"http://{host}:{port}/",
+            params=[("q", f"{url}"), ("u", f"{config.user_agent}")],
+            stream=True, timeout=config.timeout)
+        with resp:
+            length = resp.headers.get("Content-Length")
+            if length and length.isdigit() and int(length) > config.max_size:
+                record_response(url, resp.status_code, None)
+                return skipped_response(url, f"Content-Length {length} is over {config.max_size} bytes", logger)
+            body = bytearray()
+            # the body is only read here, so a read timeout or a broken
+            # connection surfaces here rather than in get.
+            for chunk in resp.iter_content(CHUNK_SIZE):
+                body += chunk
+                if len(body) > config.max_size:
+                    record_response(url, resp.status_code, None)
+                    return skipped_response(url, f"Body is over {config.max_size} bytes", logger)
+    except requests.RequestException as e:
+        return failed_response(url, e, logger)
+    body = bytes(body)
+    record_response(url, resp.status_code, body)
+    return decode_response(url, resp.status_code, body, content_types, logger)
+
+def record_response(url, status_code, body):
+    '''Adds the cache server's response to the corpus being recorded, if any. body is None if it was too large.'''
+    corpus = get_recording()
+    if corpus is not None:
+        corpus.record(url, status_code, body)
+
+def replay_response(url, config, content_types=None, logger=None):
+    '''Same as download, with the response read from the corpus being replayed.'''
+    recorded = get_replaying().lookup(url)
+    if recorded is None:
+        return failed_response(url, LookupError("not in the replay corpus"), logger)
+    status_code, body = recorded
+    if body is None or len(body) > config.max_size:
+        return skipped_response(url, f"Body is over {config.max_size} bytes", logger)
+    return decode_response(url, status_code, body, content_types, logger)
+
+def decode_response(url, status_code, body, content_types=None, logger=None):
+    '''Turns the cache server's cbor encoded body into a Response.'''
+    try:
+        if status_code < 400 and body:
+            response = Response(cbor.loads(body))
+            if content_types and response.status == 200:
+                # only pages worth parsing are unpickled to check their type.
+                content_type = _content_type(response)
+                if content_type and not content_type.startswith(content_types):
+                    return skipped_response(url, f"Content-Type {content_type} is not accepted", logger)
+            return response
     except (EOFError, ValueError) as e:
         pass
-    logger.error(f"Spacetime Response error {resp} with url {url}.")
+    if logger:
+        logger.error(f"Spacetime Response error <Response [{status_code}]> with url {url}.")
     return Response({
-        "error": f"Spacetime Response error {resp} with url {url}.",
-        "status": resp.status_code,
+        "error": f"Spacetime Response error <Response [{status_code}]> with url {url}.",
+        "status": status_code,
         "url": url})
+
+def skipped_response(url, reason, logger=None):
+    if logger:
+        logger.info(f"Skipped {url}: {reason}.")
+    return Response({
+        "error": f"Skipped: {reason}.",
+        "status": STATUS_SKIPPED,
+        "url": url})
+
+def failed_response(url, error, logger=None):
+    if logger:
+        logger.error(f"Cache server request failed with {error!r} for url {url}.")
+    return Response({
+        "error": f"Cache server request failed with {error!r}.",
+        "status": STATUS_FAILED,
+        "url": url})
+
+def _content_type(response):
+    '''Returns the lowercase Content-Type of the page behind response, if known.'''
+    content_type = response.headers.get("Content-Type")
+    return content_type.strip().lower() if content_type else None
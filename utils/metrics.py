@@ -0,0 +1,214 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Lock, Thread, Event
+
+
+# Latency histograms count durations in buckets of microseconds, one per
+# microsecond up to 8, then four per power of two, so quantiles are within 25%.
+SUB_BUCKETS = 4
+MAX_EXPONENT = 32           # 2**32 us, over an hour, and longer go in the last bucket
+HISTOGRAM_BUCKETS = 2 * SUB_BUCKETS + (MAX_EXPONENT - 3) * SUB_BUCKETS
+QUANTILES = (0.5, 0.9, 0.99)
+TOP_HOSTS = 20              # hosts listed in the queue depths of a snapshot
+
+
+class Histogram(object):
+    '''A latency histogram cheap enough to record on every page.'''
+    def __init__(self):
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = Lock()
+
+    def record(self, seconds: float) -> None:
+        bucket = _bucket(int(seconds * 1e6))
+        with self.lock:
+            self.buckets[bucket] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def snapshot(self) -> dict:
+        '''Count, mean, max and approximate quantiles, in seconds.'''
+        with self.lock:
+            buckets = list(self.buckets)
+            count, total, maximum = self.count, self.total, self.max
+        summary = {"count": count, "mean": total / count if count else 0.0, "max": maximum}
+        for quantile in QUANTILES:
+            summary[f"p{round(quantile * 100)}"] = _quantile(buckets, count, quantile, maximum)
+        return summary
+
+
+class Metrics(object):
+    '''
+    Counters and latency histograms of every stage of the crawl, plus gauges
+    read when a snapshot is taken. A MetricsReporter writes snapshots to a
+    file every few seconds and serves them as text on a local port.
+    '''
+    def __init__(self):
+        self.counters = dict()      # dict[name, int]
+        self.histograms = dict()    # dict[name, Histogram]
+        self.gauges = dict()        # dict[name, callable returning a number or a dict]
+        self.started = time.time()
+        self.lock = Lock()
+
+    def increment(self, name: str, count: int=1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + count
+
+    def observe(self, name: str, seconds: float) -> None:
+        '''Records a duration in the histogram called name.'''
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        histogram.record(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        '''Records how long the with block takes in the histogram called name.'''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def gauge(self, name: str, read) -> None:
+        '''Registers read, called with no arguments to get the gauge's value at every snapshot.'''
+        with self.lock:
+            self.gauges[name] = read
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = dict(self.histograms)
+            gauges = dict(self.gauges)
+        gauge_values = dict()
+        for name, read in gauges.items():
+            try:
+                gauge_values[name] = read()
+            except Exception as err:
+                gauge_values[name] = repr(err)
+        return {
+            "time": time.time(),
+            "uptime": time.time() - self.started,
+            "counters": counters,
+            "gauges": gauge_values,
+            "histograms": {
+                name: histogram.snapshot() for name, histogram in histograms.items()}}
+
+    def write(self, path: str) -> None:
+        '''Writes a snapshot to path as json.'''
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.snapshot(), file, indent=1, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def render_text(self) -> str:
+        '''A snapshot as one "name value" line per number, for the local endpoint.'''
+        snapshot = self.snapshot()
+        lines = [f"uptime {snapshot['uptime']:.1f}"]
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"{name} {value}")
+        for name, value in sorted(snapshot["gauges"].items()):
+            if isinstance(value, dict):
+                lines.extend(f"{name}{{{key}}} {item}" for key, item in value.items())
+            else:
+                lines.append(f"{name} {value}")
+        for name, summary in sorted(snapshot["histograms"].items()):
+            lines.extend(
+                f"{name}_{key} {value:.6g}" for key, value in summary.items())
+        return "\n".join(lines) + "\n"
+
+
+# shared by every module, like the logging loggers.
+metrics = Metrics()
+
+
+class MetricsReporter(object):
+    '''Writes a snapshot to a file every interval seconds, and serves them on a local port if one is given.'''
+    def __init__(self, registry: Metrics, path: str, interval: float, port: int=0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.stopped = Event()
+        self.writer = Thread(target=self._write_periodically, daemon=True)
+        self.server = None
+        if port:
+            self.server = ThreadingHTTPServer(("127.0.0.1", port), _handler_for(registry))
+            self.server.daemon_threads = True
+            self.server_thread = Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self) -> None:
+        self.writer.start()
+        if self.server is not None:
+            self.server_thread.start()
+
+    def stop(self) -> None:
+        '''Stops serving and writes a last snapshot.'''
+        self.stopped.set()
+        self.writer.join()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        self.registry.write(self.path)
+
+    def _write_periodically(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.registry.write(self.path)
+
+
+def _handler_for(registry: Metrics):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/json"):
+                body = json.dumps(registry.snapshot(), sort_keys=True).encode("utf-8")
+                content_type = "application/json"
+            else:
+                body = registry.render_text().encode("utf-8")
+                content_type = "text/plain; charset=utf-8"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass    # requests are not worth a log line
+    return MetricsHandler
+
+
+def _bucket(micros: int) -> int:
+    if micros < 2 * SUB_BUCKETS:
+        return max(micros, 0)
+    exponent = micros.bit_length()
+    sub_bucket = (micros >> (exponent - 3)) - SUB_BUCKETS
+    return min(
+        2 * SUB_BUCKETS + (exponent - 4) * SUB_BUCKETS + sub_bucket,
+        HISTOGRAM_BUCKETS - 1)
+
+
+def _bucket_bound(bucket: int) -> int:
+    '''Microseconds every duration in bucket is below.'''
+    if bucket < 2 * SUB_BUCKETS:
+        return bucket + 1
+    exponent, sub_bucket = divmod(bucket - 2 * SUB_BUCKETS, SUB_BUCKETS)
+    return (SUB_BUCKETS + sub_bucket + 1) << (exponent + 1)
+
+
+def _quantile(buckets: list[int], count: int, quantile: float, maximum: float) -> float:
+    '''Upper bound of the bucket holding the quantile, in seconds.'''
+    if not count:
+        return 0.0
+    rank = quantile * count
+    seen = 0
+    for bucket, bucket_count in enumerate(buckets):
+        seen += bucket_count
+        if seen >= rank:
+            return min(_bucket_bound(bucket) / 1e6, maximum)
+    return maximum
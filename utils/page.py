@@ -0,0 +1,52 @@
+from typing import NamedTuple
+from urllib.parse import urljoin, urldefrag
+
+from lxml import html, etree
+
+
+# elements whose text is never shown to a reader.
+INVISIBLE_TAGS = ("script", "style", "noscript", "template", etree.Comment)
+
+
+class Page(NamedTuple):
+    title: str
+    text: str           # visible text, with a space between text nodes
+    links: list[str]    # absolute, defragmented hrefs of <a> and <area> elements
+
+
+def parse_page(url: str, content: bytes) -> Page:
+    '''
+    Parses the html content once and derives the title, visible text and links from the same tree.
+    Relative links are resolved against the page's <base href> if any, else against url.
+    '''
+    try:
+        tree = html.fromstring(content)
+    except (etree.LxmlError, ValueError):
+        # empty or unparsable document
+        return Page("", "", [])
+
+    base_url = url
+    base = tree.find(".//base[@href]")
+    if base is not None:
+        base_url = _absolute(url, base.get("href")) or url
+
+    links = list()
+    for element in tree.iter("a", "area"):
+        href = element.get("href")
+        if href:
+            link = _absolute(base_url, href)
+            if link:
+                links.append(link)
+
+    title = (tree.findtext(".//title") or "").strip()
+    etree.strip_elements(tree, *INVISIBLE_TAGS, with_tail=False)
+    text = " ".join(tree.itertext())
+    return Page(title, text, links)
+
+
+def _absolute(base_url: str, href: str) -> str:
+    '''Returns href resolved against base_url without its fragment, or None if it is malformed.'''
+    try:
+        return urldefrag(urljoin(base_url, href.strip())).url
+    except ValueError:
+        return None
@@ -0,0 +1,98 @@
+import cProfile
+import io
+import sys
+import pstats
+import threading
+import tracemalloc
+
+from threading import Lock
+
+
+# histograms of utils.metrics reported per stage, in crawl order.
+STAGES = (
+    "download", "parse", "tokenize", "frontier_add", "frontier_pop",
+    "robots_fetch", "robots_wait")
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 15
+# from 3.12 cProfile is built on sys.monitoring, one profile sees every thread
+# and no other may be enabled alongside it.
+PROCESS_WIDE = sys.version_info >= (3, 12)
+
+
+class Profiler(object):
+    '''
+    Runs cProfile over the calling thread and every thread started while it
+    runs, the workers, parsing threads and robots.txt fetchers alike, and
+    traces memory allocations if trace_memory is set. From Python 3.12 a
+    single process wide profile covers them all. Pages parsed in the
+    parsing processes are not profiled, set PARSEPROCESSES to 0 to see them.
+    '''
+    def __init__(self, stats_path=None, trace_memory=False):
+        self.stats_path = stats_path    # cProfile is off if None
+        self.trace_memory = trace_memory
+        self.profiles = list()          # list[cProfile.Profile], one per thread
+        self.lock = Lock()
+
+    def start(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        if self.stats_path:
+            if not PROCESS_WIDE:
+                # every new thread calls _profile_thread first, which hands it over to cProfile.
+                threading.setprofile(self._profile_thread)
+            profile = cProfile.Profile()
+            self.profiles.append(profile)
+            profile.enable()
+
+    def stop(self):
+        '''Stops profiling, saves the merged stats to stats_path and returns the reports as text.'''
+        out = io.StringIO()
+        if self.stats_path:
+            if not PROCESS_WIDE:
+                threading.setprofile(None)
+            # the calling thread's profile goes first, disabling the others only affects this thread.
+            self.profiles[0].disable()
+            with self.lock:
+                stats = pstats.Stats(*self.profiles, stream=out)
+            stats.dump_stats(self.stats_path)
+            threads = "all threads" if PROCESS_WIDE else f"{len(self.profiles)} threads"
+            out.write(f"Profile of {threads} saved to {self.stats_path}.\n")
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+        if self.trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            out.write(
+                f"Memory: {current / 2**20:.1f} MiB allocated at the end, "
+                f"{peak / 2**20:.1f} MiB at the peak.\n")
+            for statistic in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+                out.write(f"{statistic}\n")
+        return out.getvalue()
+
+    def _profile_thread(self, frame, event, arg):
+        # runs inside the new thread, which must not die because it cannot be profiled.
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return
+        with self.lock:
+            self.profiles.append(profile)
+
+
+def stage_report(snapshot, elapsed):
+    '''Pages per second and the time spent in every stage, from a utils.metrics snapshot.'''
+    histograms = snapshot["histograms"]
+    pages = histograms.get("download", {}).get("count", 0)
+    lines = [
+        f"Crawled {pages} pages in {elapsed:.2f} seconds, "
+        f"{pages / elapsed if elapsed else 0:.1f} pages/s."]
+    for stage in STAGES:
+        summary = histograms.get(stage)
+        if not summary:
+            continue
+        lines.append(
+            f"{stage:>14}: {summary['count']:>8} calls, "
+            f"{summary['mean'] * summary['count']:>9.3f} s total, "
+            f"mean {summary['mean'] * 1e3:.3f} ms, p99 {summary['p99'] * 1e3:.3f} ms")
+    return "\n".join(lines)
@@ -1,14 +1,49 @@
 import pickle
 
+# Status of a response the crawler chose not to download in full, outside
+# of the 600-606 range the cache server uses for its own errors.
+STATUS_SKIPPED = 607
+# Status of a download that never got a response from the cache server.
+STATUS_FAILED = 608
+
 class Response(object):
+    '''
+    A cache server response. The page behind it, raw_response, is only
+    unpickled the first time it is used, so responses rejected by their
+    status never pay for it.
+    '''
+    __slots__ = ("url", "status", "error", "size", "_pickled", "_raw_response")
+
     def __init__(self, resp_dict):
         self.url = resp_dict["url"]
         self.status = resp_dict["status"]
         self.error = resp_dict["error"] if "error" in resp_dict else None
-        try:
-            self.raw_response = (
-                pickle.loads(resp_dict["response"])
-                if "response" in resp_dict else
-                None)
-        except TypeError:
-            self.raw_response = None
+        self._pickled = resp_dict.get("response")
+        # bytes of the pickled page, an upper bound of its content's length.
+        self.size = len(self._pickled) if isinstance(self._pickled, bytes) else 0
+        self._raw_response = None
+
+    @property
+    def raw_response(self):
+        '''The requests.Response of the page, or None if there is none.'''
+        if self._pickled is not None:
+            try:
+                self._raw_response = pickle.loads(self._pickled)
+            except (TypeError, EOFError, ValueError, pickle.UnpicklingError):
+                self._raw_response = None
+            self._pickled = None
+        return self._raw_response
+
+    @property
+    def body(self):
+        '''The page's content as a memoryview, or None if there is none.'''
+        raw_response = self.raw_response
+        if raw_response is None or raw_response.content is None:
+            return None
+        return memoryview(raw_response.content)
+
+    @property
+    def headers(self):
+        '''The page's headers, empty if there is no page.'''
+        raw_response = self.raw_response
+        return raw_response.headers if raw_response is not None else {}
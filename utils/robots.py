@@ -1,93 +1,205 @@
+import re
 import time
 from logging import Logger
-from urllib.parse import urlparse
+from threading import Lock
+from urllib.parse import urlparse, ParseResult
 
-from utils.response import Response
 from utils.config import Config
 from utils.download import download
 
 
-# rules example dict:
-#   dict{netloc: ([list of allowed paths], [list of disallowed paths])}
+# robots.txt files are refetched once they are this many seconds old.
+ROBOTS_TTL = 24 * 60 * 60
+# Crawl-delay values above this are capped, so one host cannot stall its urls indefinitely.
+MAX_CRAWL_DELAY = 30.0
 
+_END = ""           # trie key of the rule ending at a node, never a path character
+_PATTERNS = "**"    # trie key of the wildcard rules whose literal prefix ends at a node
 
-def robots_check(
-    url: str,
-    rules: dict[str, tuple[list[str], list[str]]],
-    config: Config, logger: Logger=None
-    ) -> list[str]:
+
+class RobotRules(object):
     '''
-    If the urls authority is new, try and process the robots.txt file.
-    Return the given url if it respects the rules and any new sitemap urls.
+    The Allow and Disallow rules of one host for our user agent, compiled once.
+
+    A path is checked against every rule at once: the longest matching rule
+    wins, and Allow wins ties, as in RFC 9309. Rules are kept in a character
+    trie keyed by their literal prefix, so checking a path costs one step per
+    character however many rules there are. Rules with * or $ are compiled to
+    regexes, and only those whose prefix matches the path are tried.
     '''
-    urls = list()
-    parsed = urlparse(url)
-    if parsed.netloc in rules:
-        # robots.txt already parsed.
-        # offending urls would have been caught elsewhere.
-        # can return url safely.
-        return [url]
-
-    resp = download(f'{parsed.scheme}://{parsed.netloc}/robots.txt', config, logger)
-    time.sleep(config.time_delay)
-    rules[parsed.netloc] = ([], []) # no robots.txt rules to follow. allow all.
-    if resp.status != 200:
-        return [url]    # no robots.txt to process
-    
-    urls = _process_robots(resp, rules)
-    if respects_robots(url, rules):
-        # url respects the newly found robots.txt
-        urls.append(url) 
-    return urls
-
-
-def respects_robots(
-    url: str,
-    rules: dict[str, (list[str], list[str])]
-    ) -> bool:
-    '''Checks if the url respects its authority's robots.txt.'''
-    parsed = urlparse(url)
-    netloc = parsed.netloc
-    if netloc not in rules:
-        # the rules will be updated in Frontier.add_url
-        return True
-    
-    allowed = rules[netloc][0]
-    disallowed = rules[netloc][1]
-
-    for disallowed_path in disallowed:
-        if parsed.path.startswith(disallowed_path):
-            # if it looks like a disallowed path, look for any Allows rule
-            return any(
-                (parsed.path.startswith(allowed_path) for allowed_path in allowed)
-                )
-    return True # not disallowed anywhere, so it respects robots.txt
-
-
-def _process_robots(
-    resp: Response,
-    rules: dict[str, tuple[list[str], list[str]]]
-    ) -> list[str]:
+    def __init__(self, rules=(), crawl_delay=None, sitemaps=()):
+        self.crawl_delay = crawl_delay  # seconds, or None if not given
+        self.sitemaps = list(sitemaps)
+        # nested dict[char, node]. node[_END] is the allow of the plain rule ending
+        # there, node[_PATTERNS] a list of (length, allow, regex) wildcard rules.
+        self._trie = dict()
+        for pattern, allow in rules:
+            if not pattern:
+                continue    # an empty rule matches nothing
+            wildcard = "*" in pattern or pattern.endswith("$")
+            node = self._trie
+            for char in pattern.split("*", 1)[0].removesuffix("$") if wildcard else pattern:
+                node = node.setdefault(char, dict())
+            if wildcard:
+                node.setdefault(_PATTERNS, list()).append(
+                    (len(pattern), allow, _compile_pattern(pattern)))
+            else:
+                node[_END] = node.get(_END, False) or allow
+
+    def allows(self, path: str) -> bool:
+        '''Checks if path, including any query, may be crawled.'''
+        best = (0, True)    # (length, allow) of the best matching rule
+        candidates = list()
+        node = self._trie
+        for length, char in enumerate(path, 1):
+            if _PATTERNS in node:
+                candidates.extend(node[_PATTERNS])
+            node = node.get(char)
+            if node is None:
+                break
+            if _END in node:
+                best = (length, node[_END])
+        else:
+            if _PATTERNS in node:
+                candidates.extend(node[_PATTERNS])
+
+        for length, allow, regex in candidates:
+            if (length, allow) > best and regex.match(path):
+                best = (length, allow)
+        return best[1]
+
+    def allows_url(self, url: str) -> bool:
+        return self.allows(_robots_path(urlparse(url)))
+
+
+# every path is allowed when a host has no robots.txt
+ALLOW_ALL = RobotRules()
+
+
+def parse_robots(text: str, user_agent: str) -> RobotRules:
     '''
-    Add an authority's robot.txt rules to the dict.
-    Return a list of sitemap links.
+    Parses a robots.txt file into the rules for user_agent. The groups naming
+    user_agent are used if there are any, else the groups for *.
     '''
-    extracted_urls = list()
-    netloc = urlparse(resp.url).netloc
-    lines = resp.raw_response.text.split('\n')
-
-    # find correct user-agent
-    start_from_idx = 0
-    for i in range(len(lines)):
-        if lines[i] == 'User-agent: *':
-            start_from_idx = i + 1 
-    # start processing from user-agent
-    for i in range(start_from_idx, len(lines)):
-        match lines[i].split():
-            case ['Sitemap:', site]:
-                extracted_urls.append(site)
-            case ['Allow:', path]:
-                rules[netloc][0].append(path)
-            case ['Disallow:', path]:
-                rules[netloc][1].append(path)
-    return extracted_urls
+    user_agent = user_agent.lower()
+    specific = list()       # (rules, crawl delays) of the groups naming user_agent
+    default = list()        # same for the groups naming *
+    sitemaps = list()
+    agents = list()         # user agents of the group being read
+    group = None
+    for line in text.splitlines():
+        key, colon, value = line.split("#", 1)[0].partition(":")
+        if not colon:
+            continue
+        key = key.strip().lower()
+        value = value.strip()
+        if key == "user-agent":
+            if group is not None:
+                # a user-agent line after rules starts a new group
+                agents, group = list(), None
+            agents.append(value.lower())
+        elif key == "sitemap":
+            if value:
+                sitemaps.append(value)
+        elif key in ("allow", "disallow", "crawl-delay"):
+            if group is None:
+                group = (list(), list())
+                if any(agent != "*" and user_agent.startswith(agent) for agent in agents):
+                    specific.append(group)
+                elif "*" in agents:
+                    default.append(group)
+            if key == "crawl-delay":
+                try:
+                    group[1].append(float(value))
+                except ValueError:
+                    pass
+            else:
+                group[0].append((value, key == "allow"))
+
+    groups = specific or default
+    rules = [rule for group_rules, _ in groups for rule in group_rules]
+    delays = [delay for _, group_delays in groups for delay in group_delays]
+    crawl_delay = min(max(delays), MAX_CRAWL_DELAY) if delays else None
+    return RobotRules(rules, crawl_delay, sitemaps)
+
+
+class RobotsCache(object):
+    '''
+    The compiled rules of every host fetched so far. Rules older than ttl
+    seconds are treated as unknown, so the host's robots.txt is fetched again.
+    '''
+    def __init__(
+            self, config: Config, logger: Logger=None,
+            ttl: float=ROBOTS_TTL, clock=time.monotonic):
+        self.config = config
+        self.logger = logger
+        self.ttl = ttl
+        self.clock = clock
+        self.rules = dict()     # dict[netloc, (RobotRules, time fetched)]
+        self.lock = Lock()
+
+    def lookup(self, netloc: str) -> RobotRules:
+        '''Returns the rules of netloc, or None if they are not fetched yet or are too old.'''
+        with self.lock:
+            cached = self.rules.get(netloc)
+        if cached is None or self.clock() - cached[1] >= self.ttl:
+            return None
+        return cached[0]
+
+    def fetch(self, scheme: str, netloc: str) -> RobotRules:
+        '''Downloads and caches the rules of netloc. Blocks for the download.'''
+        resp = download(f'{scheme}://{netloc}/robots.txt', self.config, self.logger)
+        if resp.status != 200 or resp.raw_response is None:
+            rules = ALLOW_ALL   # no robots.txt to process
+        else:
+            rules = parse_robots(resp.raw_response.text, self.config.user_agent)
+        self.store(netloc, rules)
+        return rules
+
+    def store(self, netloc: str, rules: RobotRules) -> None:
+        '''Caches rules as the rules of netloc from now on, e.g. ALLOW_ALL when its robots.txt cannot be fetched.'''
+        with self.lock:
+            self.rules[netloc] = (rules, self.clock())
+
+    def crawl_delay(self, netloc: str) -> float:
+        '''Returns the Crawl-delay of netloc's robots.txt, or None if it has none or is not fetched yet.'''
+        with self.lock:
+            cached = self.rules.get(netloc)
+        return cached[0].crawl_delay if cached is not None else None
+
+    def check(self, urls: list[str]) -> tuple[list[str], dict[str, list[str]]]:
+        '''
+        Checks a batch of urls, e.g. every link of a page, looking up each host's rules once.
+        Never fetches. Returns the urls allowed, in order, and the urls of hosts
+        whose rules are unknown, by netloc.
+        '''
+        allowed = list()
+        unknown = dict()        # dict[netloc, list[url]]
+        host_rules = dict()     # dict[netloc, RobotRules or None] of this batch
+        for url in urls:
+            parsed = urlparse(url)
+            netloc = parsed.netloc
+            if netloc in host_rules:
+                rules = host_rules[netloc]
+            else:
+                rules = host_rules[netloc] = self.lookup(netloc)
+            if rules is None:
+                unknown.setdefault(netloc, list()).append(url)
+            elif rules.allows(_robots_path(parsed)):
+                allowed.append(url)
+        return allowed, unknown
+
+
+def _robots_path(parsed: ParseResult) -> str:
+    '''The part of a url robots.txt rules are matched against.'''
+    path = parsed.path or "/"
+    return f"{path}?{parsed.query}" if parsed.query else path
+
+
+def _compile_pattern(pattern: str) -> re.Pattern:
+    '''Compiles a rule with * wildcards and an optional $ end anchor to a regex.'''
+    anchored = pattern.endswith("$")
+    if anchored:
+        pattern = pattern[:-1]
+    regex = ".*".join(map(re.escape, pattern.split("*")))
+    return re.compile(regex + (r"\Z" if anchored else ""), re.DOTALL)
@@ -0,0 +1,117 @@
+import os
+
+from array import array
+
+
+MAX_LOAD = 0.5   # grow the table once it is half full
+
+
+def url_digest(urlhash: str) -> int:
+    '''Returns the 64 bit digest of a hex urlhash from utils.get_urlhash.'''
+    return int(urlhash[:16], 16)
+
+
+class SeenSet():
+    '''
+    Compact set of 64 bit url digests.
+
+    Digests are stored inline in an array of unsigned 64 bit slots with
+    linear probing, so a million urls take 16 to 32 MiB depending on how
+    full the table is, instead of roughly 100 MiB for a set of python ints.
+    With 2**64 possible digests, a false positive is negligible for any
+    crawl, so membership is treated as exact.
+    '''
+    _slots: array
+    _mask: int
+    _count: int
+
+    def __init__(self, capacity: int=1 << 16) -> None:
+        size = 1
+        while size * MAX_LOAD < capacity:
+            size <<= 1
+        self._slots = array('Q', bytes(8 * size))
+        self._mask = size - 1
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self):
+        return (digest for digest in self._slots if digest)
+
+    def __contains__(self, digest: int) -> bool:
+        digest = digest or 1    # 0 marks an empty slot
+        slots = self._slots
+        mask = self._mask
+        i = digest & mask
+        while slots[i]:
+            if slots[i] == digest:
+                return True
+            i = (i + 1) & mask
+        return False
+
+    def add(self, digest: int) -> bool:
+        '''Adds the digest. Returns True if it was not already in the set.'''
+        digest = digest or 1
+        slots = self._slots
+        mask = self._mask
+        i = digest & mask
+        while slots[i]:
+            if slots[i] == digest:
+                return False
+            i = (i + 1) & mask
+        slots[i] = digest
+        self._count += 1
+        if self._count > len(slots) * MAX_LOAD:
+            self._grow()
+        return True
+
+    def memory_usage(self) -> int:
+        '''Returns the number of bytes used by the table.'''
+        return self._slots.itemsize * len(self._slots)
+
+    def dump(self, path: str) -> None:
+        '''Writes the table to path, so it can be loaded without rehashing.'''
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            array('Q', [self._count]).tofile(file)
+            self._slots.tofile(file)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, expected_count: int) -> "SeenSet":
+        '''
+        Reads a table written by dump.
+        Returns None if there is none, or if it does not hold expected_count digests.
+        '''
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as file:
+            header = array('Q')
+            try:
+                header.fromfile(file, 1)
+            except EOFError:
+                return None
+            if header[0] != expected_count:
+                return None
+            slots = array('Q')
+            slots.frombytes(file.read())
+        seen = cls(capacity=0)
+        seen._slots = slots
+        seen._mask = len(slots) - 1
+        seen._count = header[0]
+        return seen
+
+    def _grow(self) -> None:
+        '''Doubles the table and reinserts every digest.'''
+        old_slots = self._slots
+        self._slots = array('Q', bytes(16 * len(old_slots)))
+        self._mask = len(self._slots) - 1
+        slots = self._slots
+        mask = self._mask
+        for digest in old_slots:
+            if digest:
+                i = digest & mask
+                while slots[i]:
+                    i = (i + 1) & mask
+                slots[i] = digest
@@ -1,31 +1,100 @@
+import os
+import pickle
+
+import numpy as np
+
+from functools import lru_cache
+from hashlib import blake2b
+from itertools import combinations
+from threading import Lock
 from utils.response import Response
+from utils.seen import SeenSet
 from urllib.parse import urlparse
 
 
 NUM_BITS = 64
+TOKEN_CHUNK = 4096  # tokens weighted at once, bounding the size of the bit matrix
+_BIT_SHIFTS = np.arange(NUM_BITS, dtype=np.uint64)
 
 
 class Simhash():
+    '''
+    Remembers page fingerprints and finds near duplicates without comparing
+    against every one of them. Byte for byte duplicates are caught before
+    that by a checksum of the raw page, so they are never parsed at all.
+
+    Fingerprints within max_distance bits of each other are near duplicates.
+    Split into max_distance + 2 blocks, two such fingerprints must agree on
+    at least two whole blocks (pigeonhole). There is one table per pair of
+    blocks, keyed by the bits of that pair, and only fingerprints sharing a
+    key with the new one in some table are compared.
+    '''
     _fingerprints: dict[str, int]
     _threshold: float
+    _max_distance: int
+    _table_masks: list[int]
+    _tables: list[dict[int, list[str]]]
+    _checksums: SeenSet
+    exact_checks: int
+    exact_duplicates: int
+    _lock: Lock
 
     def __init__(self, threshold=0.9) -> None:
         self._fingerprints = dict()
         self._threshold = threshold
+        self._max_distance = int(NUM_BITS * (1 - threshold) + 1e-9)
+        self._table_masks = _table_masks(self._max_distance)
+        self._tables = [dict() for _ in self._table_masks]
+        self._checksums = SeenSet()
+        self.exact_checks = 0       # pages checked by is_exact_duplicate
+        self.exact_duplicates = 0   # of which were exact duplicates
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
+
+    def is_exact_duplicate(self, content: bytes) -> bool:
+        '''
+        Remember the checksum of the raw page.
+        Return True if a page with the exact same bytes was seen before.
+        '''
+        checksum = int.from_bytes(blake2b(content, digest_size=8).digest(), "little")
+        with self._lock:
+            self.exact_checks += 1
+            if self._checksums.add(checksum):
+                return False
+            self.exact_duplicates += 1
+            return True
 
     def is_similar(self, resp: Response, freqs: dict[str, int]) -> str:
         '''Return the url with similar content if found, else None.'''
+        return self.find_similar(resp.url, compute_fingerprint(freqs))
+
+    def find_similar(self, url: str, fingerprint: int) -> str:
+        '''
+        Remember the url's precomputed fingerprint.
+        Return the url with the most similar content if found, else None.
+        '''
         # use url minus fragment as key to store fingerprint
-        parsed = urlparse(resp.url)
+        parsed = urlparse(url)
         url = parsed.netloc + parsed.path + parsed.query
-        if url not in self._fingerprints:
-            self._add_fingerprint(url, freqs)
-
-        # compare the fingerprint to all others
-        for other_url in self._fingerprints:
-            if url != other_url and self._are_near(url, other_url):
-                return other_url
-        return None
+        with self._lock:
+            if url in self._fingerprints:
+                fingerprint = self._fingerprints[url]
+            else:
+                self._add(url, fingerprint)
+
+            # only compare to fingerprints sharing a pair of blocks with this one
+            nearest_url = None
+            nearest_distance = self._max_distance + 1
+            for mask, table in zip(self._table_masks, self._tables):
+                for other_url in table[fingerprint & mask]:
+                    if other_url == url:
+                        continue
+                    distance = (fingerprint ^ self._fingerprints[other_url]).bit_count()
+                    if distance < nearest_distance:
+                        nearest_url, nearest_distance = other_url, distance
+        return nearest_url
     
     def compute_similarity(self, url_a: str, url_b: str) -> float:
         '''
@@ -37,36 +106,118 @@ class Simhash():
 
         fingerprint_a = self._fingerprints[url_a]
         fingerprint_b = self._fingerprints[url_b]
-        # get intersection of the bits of fingerprints
-        intersect_bits = ~(fingerprint_a ^ fingerprint_b)
+        # count the bits both fingerprints agree on
+        differing_bits = (fingerprint_a ^ fingerprint_b).bit_count()
+        return (NUM_BITS - differing_bits) / NUM_BITS
 
-        # sum up bits
-        count_bits = 0
-        for _ in range(NUM_BITS):
-            count_bits += 1 if 1 & intersect_bits else 0
-            intersect_bits >>= 1
+    def dump(self, path: str) -> None:
+        '''Saves every fingerprint and checksum to path.'''
+        with self._lock:
+            data = pickle.dumps({
+                "fingerprints": self._fingerprints,
+                "checksums": self._checksums})
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
 
-        return count_bits / NUM_BITS
+    def load(self, path: str) -> None:
+        '''Adds every fingerprint and checksum saved to path by dump.'''
+        with open(path, "rb") as file:
+            saved = pickle.load(file)
+        with self._lock:
+            for url, fingerprint in saved["fingerprints"].items():
+                if url not in self._fingerprints:
+                    self._add(url, fingerprint)
+            if not self._checksums:
+                self._checksums = saved["checksums"]
+            else:
+                for checksum in saved["checksums"]:
+                    self._checksums.add(checksum)
 
     def _are_near(self, url_a: str, url_b: str) -> bool:
         '''Returns true if fingerprint_a and fingerprint_b are near duplicates.'''
         return self.compute_similarity(url_a, url_b) >= self._threshold
 
+    def _add(self, url: str, fingerprint: int) -> None:
+        '''Remembers the fingerprint and indexes it in every table.'''
+        self._fingerprints[url] = fingerprint
+        for mask, table in zip(self._table_masks, self._tables):
+            key = fingerprint & mask
+            urls = table.get(key)
+            if urls is None:
+                table[key] = [url]
+            else:
+                urls.append(url)
+
     def _add_fingerprint(self, url: str, freqs: dict[str, int]) -> None:
         '''Computes and adds fingerprint to remember.'''
-        self._fingerprints[url] = self._compute_fingerprint(freqs)
+        self._add(url, self._compute_fingerprint(freqs))
         
     def _compute_fingerprint(self, freqs: dict[str, int]) -> int:
         '''Simhash algorithm. Weights determined by word frequencies.'''
-        int_vector = [0] * NUM_BITS
-        for token, freq in freqs.items():
-            # add the current token's weight to the vector
-            hash_val = hash(token)
-            bin_str = bin(hash_val)[2:]
-            for i, bit in enumerate(reversed(bin_str)):
-                weight = freq if bit == '1' else -freq
-                int_vector[NUM_BITS-1-i] += weight
-        
-        # convert the vector with sum of weights to a binary fingerprint
-        fingerprint_vector = ['1' if val > 0 else '0' for val in int_vector]
-        return int(''.join(fingerprint_vector), 2)
+        return compute_fingerprint(freqs)
+
+
+def _table_masks(max_distance: int) -> list[int]:
+    '''
+    Splits the fingerprint bits into max_distance + 2 blocks of near equal
+    size and returns the mask covering each pair of blocks.
+    '''
+    count = max_distance + 2
+    blocks = list()
+    shift = 0
+    for i in range(count):
+        size = NUM_BITS // count + (i < NUM_BITS % count)
+        blocks.append(((1 << size) - 1) << shift)
+        shift += size
+    return [block_a | block_b for block_a, block_b in combinations(blocks, 2)]
+
+
+def token_hash(token: str) -> int:
+    '''Stable 64 bit hash of a token, the same in every process and run.'''
+    return _token_hash(token)
+
+
+@lru_cache(maxsize=1 << 16)
+def _token_hash(token: str) -> int:
+    return int.from_bytes(blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def compute_fingerprint(freqs: dict[str, int]) -> int:
+    '''
+    Simhash algorithm. Weights determined by word frequencies.
+    Kept outside of Simhash so it can run in a parsing process.
+    '''
+    return compute_fingerprints([freqs])[0]
+
+
+def compute_fingerprints(pages: list[dict[str, int]]) -> list[int]:
+    '''
+    Simhash fingerprints of many pages at once. Every token's weight is
+    added to the bit positions set in its hash and subtracted from the
+    others, for TOKEN_CHUNK tokens at a time across all pages.
+    '''
+    hashes = np.fromiter(
+        (_token_hash(token) for freqs in pages for token in freqs),
+        dtype=np.uint64)
+    weights = np.fromiter(
+        (freq for freqs in pages for freq in freqs.values()),
+        dtype=np.int64, count=len(hashes))
+    # page index of every token, to sum each page's weights separately
+    page_of_token = np.repeat(
+        np.arange(len(pages)), [len(freqs) for freqs in pages])
+
+    vectors = np.zeros((len(pages), NUM_BITS), dtype=np.int64)
+    for start in range(0, len(hashes), TOKEN_CHUNK):
+        chunk = slice(start, start + TOKEN_CHUNK)
+        bits = (hashes[chunk, None] >> _BIT_SHIFTS) & np.uint64(1)
+        signed = np.where(bits.astype(bool), weights[chunk, None], -weights[chunk, None])
+        # tokens of a page are contiguous, so sum each page's run of rows
+        chunk_pages = page_of_token[chunk]
+        starts = np.flatnonzero(np.diff(chunk_pages, prepend=-1))
+        vectors[chunk_pages[starts]] += np.add.reduceat(signed, starts, axis=0)
+
+    # bit i of the fingerprint is set if the weights of hash bit i sum above 0
+    packed = np.packbits(vectors > 0, axis=1, bitorder="little")
+    return [int.from_bytes(row.tobytes(), "little") for row in packed]
@@ -0,0 +1,97 @@
+import gzip
+import time
+from io import BytesIO
+from logging import Logger
+from typing import Callable, ContextManager, Iterator, NamedTuple
+from urllib.parse import urlparse
+
+from lxml import etree
+
+from utils import url_filter
+from utils.config import Config
+from utils.download import download
+
+
+GZIP_MAGIC = b"\x1f\x8b"
+# at most this many sitemap files are fetched per call, however deep the indexes go.
+MAX_SITEMAPS = 1000
+
+
+class SitemapEntry(NamedTuple):
+    loc: str
+    lastmod: str        # W3C datetime as written in the sitemap, "" if missing
+    is_sitemap: bool    # True for the <sitemap> entries of a sitemap index
+
+
+def iter_sitemap(content: bytes) -> Iterator[SitemapEntry]:
+    '''
+    Stream the <url> entries of a sitemap, or the <sitemap> entries of a sitemap index.
+    content may be gzipped. Each entry is dropped from the tree once read, so memory
+    stays constant however large the sitemap is.
+    '''
+    source = BytesIO(content)
+    if content.startswith(GZIP_MAGIC):
+        source = gzip.GzipFile(fileobj=source)
+    events = etree.iterparse(
+        source, events=("end",), tag=("{*}url", "{*}sitemap"),
+        resolve_entities=False, no_network=True, recover=True)
+    try:
+        for _, element in events:
+            loc = (element.findtext("{*}loc") or "").strip()
+            if loc:
+                yield SitemapEntry(
+                    loc, (element.findtext("{*}lastmod") or "").strip(),
+                    etree.QName(element).localname == "sitemap")
+            element.clear(keep_tail=True)
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+    except (etree.LxmlError, OSError, EOFError):
+        # truncated or malformed sitemap, keep what was read.
+        return
+
+
+def get_sitemap_urls(
+    sitemap_urls: list[str], config: Config, logger: Logger=None,
+    fetched: set[str]=None, host_slot: Callable[[str], ContextManager]=None
+    ) -> list[str]:
+    '''
+    Download the sitemaps, following sitemap indexes, and return the urls they
+    list that pass the url filter, most recently modified first.
+    Sitemaps already in fetched are skipped, and every one downloaded is added to it.
+    Each download is made inside host_slot(netloc) if it is given, e.g.
+    Frontier.host_slot, else the politeness delay is slept after it.
+    '''
+    if fetched is None:
+        fetched = set()
+    to_fetch = list(sitemap_urls)
+    entries = list()    # (lastmod, loc) of every page listed
+    downloads = 0
+    while to_fetch and downloads < MAX_SITEMAPS:
+        sitemap_url = to_fetch.pop()
+        if sitemap_url in fetched or not _in_allowed_domain(sitemap_url):
+            continue
+        fetched.add(sitemap_url)
+        if host_slot is not None:
+            with host_slot(urlparse(sitemap_url).netloc):
+                resp = download(sitemap_url, config, logger)
+        else:
+            resp = download(sitemap_url, config, logger)
+            time.sleep(config.time_delay)
+        downloads += 1
+        if resp.status != 200 or resp.raw_response is None:
+            continue
+        for entry in iter_sitemap(resp.raw_response.content):
+            if entry.is_sitemap:
+                to_fetch.append(entry.loc)
+            else:
+                entries.append((entry.lastmod, entry.loc))
+    if logger and to_fetch:
+        logger.info(f"Stopped after {MAX_SITEMAPS} sitemaps, {len(to_fetch)} left unread.")
+
+    # W3C datetimes sort chronologically as strings, and entries without one go last.
+    entries.sort(key=lambda entry: entry[0], reverse=True)
+    return url_filter.filter_urls([loc for _, loc in entries])
+
+
+def _in_allowed_domain(url: str) -> bool:
+    return urlparse(url).netloc.endswith(url_filter.ALLOWED_DOMAINS)
@@ -0,0 +1,64 @@
+import heapq
+from collections.abc import Iterator, Mapping
+
+
+class SpaceSaving(object):
+    '''
+    Approximate counts of the most frequent keys in bounded memory, using the
+    Space-Saving algorithm (Metwally et al.). At most `capacity` keys are kept.
+    Once it is full, a new key replaces the least counted one and inherits its
+    count. So a count can be too high by at most the smallest count kept, and
+    any key seen more than total / capacity times is always kept.
+    '''
+    def __init__(self, capacity: int):
+        assert capacity > 0, "capacity should be positive"
+        self.capacity = capacity
+        self.counts = dict()    # dict[key, count], each an overestimate by at most errors[key]
+        self.errors = dict()    # dict[key, count inherited from the key it replaced]
+        # one (count, key) entry per key. Counts only grow, so an entry is a lower
+        # bound of its key's count and is refreshed when it reaches the top.
+        self._heap = list()
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def __contains__(self, key) -> bool:
+        return key in self.counts
+
+    def __getitem__(self, key) -> int:
+        return self.counts.get(key, 0)
+
+    def items(self) -> Iterator:
+        return iter(self.counts.items())
+
+    def update(self, frequencies: Mapping) -> None:
+        '''Adds every key of frequencies with its count, like Counter.update.'''
+        for key, count in frequencies.items():
+            self.add(key, count)
+
+    def add(self, key, count: int = 1) -> None:
+        counts = self.counts
+        if key in counts:
+            counts[key] += count
+            return
+        if len(counts) < self.capacity:
+            counts[key] = count
+            self.errors[key] = 0
+        else:
+            minimum, evicted = self._pop_min()
+            del counts[evicted]
+            del self.errors[evicted]
+            counts[key] = minimum + count
+            self.errors[key] = minimum
+        heapq.heappush(self._heap, (counts[key], key))
+
+    def _pop_min(self) -> tuple:
+        '''Removes and returns the heap entry of the least counted key.'''
+        heap = self._heap
+        counts = self.counts
+        while True:
+            count, key = heap[0]
+            if counts[key] == count:
+                return heapq.heappop(heap)
+            # stale entry, it is still a lower bound so push it back down.
+            heapq.heapreplace(heap, (counts[key], key))
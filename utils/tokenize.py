@@ -1,40 +1,57 @@
-from collections import defaultdict
+from collections import Counter
+from collections.abc import Iterable
 import re
 
+from utils.stopwords import STOPWORDS
+
 
 Token = str # for type hints
 
+TOKEN_PATTERN = re.compile(r'[a-zA-Z0-9]+')    # a run of alphanumeric chars
+TRAILING_TOKEN = re.compile(r'[a-zA-Z0-9]*\Z')  # a token possibly cut off by the end of a chunk
+
 
-def computeWordFrequencies(text_from_html: str) -> defaultdict[Token, int]:
+def computeWordFrequencies(text_from_html: str, skip_stopwords: bool=False) -> Counter[Token]:
     '''
     Takes in a string, splitting on any non-alphanumeric chars.
-    Returns a mapping of the tokens to their frequency.
+    Returns a mapping of the lowercase tokens to their frequency,
+    without English stopwords if skip_stopwords is set.
     '''
-    frequencies = defaultdict(int)
-    tokens = _tokenize(text_from_html)
+    frequencies = Counter()
+    _count_tokens(text_from_html, frequencies)
+    if skip_stopwords:
+        _remove_stopwords(frequencies)
+    return frequencies
+
 
-    for token in tokens:
-        frequencies[token] += 1
+def computeWordFrequenciesStream(chunks: Iterable[str], skip_stopwords: bool=False) -> Counter[Token]:
+    '''
+    Same as computeWordFrequencies, for text arriving in chunks.
+    A token split across two chunks is counted once, whole.
+    '''
+    frequencies = Counter()
+    carry = ''
+    for chunk in chunks:
+        text = carry + chunk
+        cut = TRAILING_TOKEN.search(text).start()
+        _count_tokens(text[:cut], frequencies)
+        carry = text[cut:]
+    _count_tokens(carry, frequencies)
+    if skip_stopwords:
+        _remove_stopwords(frequencies)
     return frequencies
 
 
-def _tokenize(to_be_tokenized: str) -> list[Token]:
-    '''Tokenizes a string by splitting on any non-alphanumeric char.'''
-    tokens = list()
-    # while loop runs until EOF
-    for line in to_be_tokenized.split('\n'):
-        # tokenize file line by line
-        _tokenize_line(line, tokens)
-    return tokens
-
-def _tokenize_line(line: str, tokens: list[Token]) -> None:
-    '''Tokenizes a line. Helper for _tokenize.'''
-    pattern = r'[^a-zA-Z0-9]'   # matches any non-alphanumeric char
-    for token in re.split(pattern, line):   # split on non-alphanumeric chars
-        if _is_valid_token(token):
-            tokens.append(token.lower())
-
-def _is_valid_token(token: str) -> bool:
-    '''Checks if the token is valid.'''
-    # checks that string is alphanumeric
-    return token.isalnum()
+def _count_tokens(text: str, frequencies: Counter[Token]) -> None:
+    '''Counts every token of text into frequencies, in a single pass over the text.'''
+    if text.isascii():
+        frequencies.update(TOKEN_PATTERN.findall(text.lower()))
+    else:
+        # lowercasing non ascii text first could turn other chars into a-z, e.g. the kelvin sign.
+        frequencies.update(map(str.lower, TOKEN_PATTERN.findall(text)))
+
+
+def _remove_stopwords(frequencies: Counter[Token]) -> None:
+    '''Drops stopwords once counted, cheaper than checking every token against them.'''
+    for stopword in STOPWORDS:
+        frequencies.pop(stopword, None)
@@ -0,0 +1,193 @@
+import os
+import pickle
+import re
+from collections import Counter
+from logging import Logger
+from threading import Lock
+from urllib.parse import urlparse, ParseResult, parse_qsl
+
+
+# Thresholds, per path template, i.e. per url with its numbers left out.
+MAX_URL_LENGTH = 300        # longer urls are never crawled
+MIN_PAGES = 10              # pages of a template crawled before its duplicate ratio counts
+DEPRIORITIZE_DUPLICATES = 0.3   # ratio of duplicate pages that deprioritizes a template
+BLOCK_DUPLICATES = 0.7          # and that blocks it
+DEPRIORITIZE_QUERY_VARIANTS = 20    # distinct sets of query keys that deprioritize a template
+BLOCK_QUERY_VARIANTS = 100          # and that block it
+DEPRIORITIZE_REPEATS = 0.5  # ratio of urls repeating a path segment that deprioritizes a template
+
+# frontier score added to the urls of a deprioritized template
+DEPRIORITIZED_PENALTY = 8.0
+
+# decisions, as logged and counted
+OK = "ok"
+DEPRIORITIZED = "deprioritized"
+BLOCKED = "blocked"
+LONG_URL = "long_url"
+
+DIGITS = re.compile(r"\d+")
+
+
+class _TemplateStats(object):
+    __slots__ = ("urls", "repeats", "query_variants", "pages", "duplicates", "decision")
+
+    def __init__(self):
+        self.urls = 0               # urls discovered
+        self.repeats = 0            # of which repeat a path segment
+        self.query_variants = None  # set of the distinct query key sets, sorted and joined, capped
+        self.pages = 0              # pages crawled
+        self.duplicates = 0         # of which were exact or near duplicates of earlier pages
+        self.decision = OK
+
+
+class TrapDetector(object):
+    '''
+    Keeps counters per host and per path template of the urls discovered and
+    the pages crawled, and flags templates that look like crawler traps:
+    infinite calendars, parameter explosions and pages that are mostly near
+    duplicates of each other. A flagged template is first deprioritized in
+    the frontier, then blocked, and every decision is logged.
+    '''
+    def __init__(self, logger: Logger=None):
+        self.logger = logger
+        self.templates = dict()     # dict[template, _TemplateStats]
+        self.hosts = dict()         # dict[netloc, Counter] of urls, pages and duplicates
+        self.decisions = Counter()  # Counter[decision] of the urls rejected or penalized
+        self._lock = Lock()
+
+    def filter_urls(self, urls: list[str]) -> list[str]:
+        '''Counts the discovered urls and returns the ones that are not in a blocked template.'''
+        kept = list()
+        with self._lock:
+            for url in urls:
+                if self._observe(urlparse(url), url):
+                    kept.append(url)
+        return kept
+
+    def record_page(self, url: str, duplicate: bool) -> None:
+        '''Counts a crawled page, and whether Simhash found it to be an exact or near duplicate.'''
+        parsed = urlparse(url)
+        template = path_template(parsed)
+        with self._lock:
+            stats = self._stats(template)
+            stats.pages += 1
+            stats.duplicates += duplicate
+            host = self._host(parsed.netloc)
+            host["pages"] += 1
+            host["duplicates"] += duplicate
+            self._decide(template, stats)
+
+    def penalty(self, url: str) -> float:
+        '''Frontier score to add to url, infinite if its template is blocked.'''
+        stats = self.templates.get(path_template(urlparse(url)))
+        if stats is None or stats.decision == OK:
+            return 0.0
+        return DEPRIORITIZED_PENALTY if stats.decision == DEPRIORITIZED else float("inf")
+
+    def is_blocked(self, url: str) -> bool:
+        stats = self.templates.get(path_template(urlparse(url)))
+        return stats is not None and stats.decision == BLOCKED
+
+    def counters(self) -> dict:
+        '''Counts of the templates per decision, and of the urls rejected or penalized per decision.'''
+        with self._lock:
+            templates = Counter(stats.decision for stats in self.templates.values())
+            return {"templates": dict(templates), "urls": dict(self.decisions)}
+
+    def worst_templates(self, n: int=10) -> list[tuple[str, dict]]:
+        '''The n flagged templates with the most urls, with their counters.'''
+        with self._lock:
+            flagged = [
+                (template, stats) for template, stats in self.templates.items()
+                if stats.decision != OK]
+            flagged.sort(key=lambda item: item[1].urls, reverse=True)
+            return [(template, _summary(stats)) for template, stats in flagged[:n]]
+
+    def dump(self, path: str) -> None:
+        with self._lock:
+            data = pickle.dumps({
+                "templates": {
+                    template: (stats.urls, stats.repeats, stats.query_variants,
+                               stats.pages, stats.duplicates, stats.decision)
+                    for template, stats in self.templates.items()},
+                "hosts": self.hosts,
+                "decisions": self.decisions})
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> None:
+        with open(path, "rb") as file:
+            saved = pickle.load(file)
+        with self._lock:
+            for template, values in saved["templates"].items():
+                stats = self.templates[template] = _TemplateStats()
+                (stats.urls, stats.repeats, stats.query_variants,
+                 stats.pages, stats.duplicates, stats.decision) = values
+            self.hosts.update(saved["hosts"])
+            self.decisions.update(saved["decisions"])
+
+    def _observe(self, parsed: ParseResult, url: str) -> bool:
+        self._host(parsed.netloc)["urls"] += 1
+        if len(url) > MAX_URL_LENGTH:
+            self.decisions[LONG_URL] += 1
+            return False
+        template = path_template(parsed)
+        stats = self._stats(template)
+        stats.urls += 1
+        segments = [segment for segment in parsed.path.split("/") if segment]
+        stats.repeats += len(segments) != len(set(segments))
+        if parsed.query:
+            if stats.query_variants is None:
+                stats.query_variants = set()
+            if len(stats.query_variants) <= BLOCK_QUERY_VARIANTS:
+                keys = {key for key, _ in parse_qsl(parsed.query, keep_blank_values=True)}
+                stats.query_variants.add("&".join(sorted(keys)))
+        self._decide(template, stats)
+        if stats.decision != OK:
+            self.decisions[stats.decision] += 1
+        return stats.decision != BLOCKED
+
+    def _decide(self, template: str, stats: _TemplateStats) -> None:
+        '''Updates the template's decision from its counters. Decisions only ever get stricter.'''
+        if stats.decision == BLOCKED:
+            return
+        duplicate_ratio = stats.duplicates / stats.pages if stats.pages >= MIN_PAGES else 0.0
+        variants = len(stats.query_variants or ())
+        if duplicate_ratio >= BLOCK_DUPLICATES or variants > BLOCK_QUERY_VARIANTS:
+            decision = BLOCKED
+        elif (duplicate_ratio >= DEPRIORITIZE_DUPLICATES
+                or variants > DEPRIORITIZE_QUERY_VARIANTS
+                or (stats.urls >= MIN_PAGES and stats.repeats / stats.urls >= DEPRIORITIZE_REPEATS)):
+            decision = DEPRIORITIZED
+        else:
+            return
+        if decision != stats.decision:
+            stats.decision = decision
+            if self.logger:
+                self.logger.info(f"{decision.capitalize()} {template}: {_summary(stats)}")
+
+    def _stats(self, template: str) -> _TemplateStats:
+        stats = self.templates.get(template)
+        if stats is None:
+            stats = self.templates[template] = _TemplateStats()
+        return stats
+
+    def _host(self, netloc: str) -> Counter:
+        host = self.hosts.get(netloc)
+        if host is None:
+            host = self.hosts[netloc] = Counter()
+        return host
+
+
+def path_template(parsed: ParseResult) -> str:
+    '''The host and path with every number replaced by 0, shared by the pages of a calendar or archive.'''
+    return parsed.netloc + DIGITS.sub("0", parsed.path)
+
+
+def _summary(stats: _TemplateStats) -> dict:
+    return {
+        "urls": stats.urls, "repeats": stats.repeats,
+        "query_variants": len(stats.query_variants or ()),
+        "pages": stats.pages, "duplicates": stats.duplicates}
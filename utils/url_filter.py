@@ -0,0 +1,144 @@
+import re
+from collections import Counter
+from threading import Lock
+from urllib.parse import urlparse, ParseResult
+
+
+# Every rule below is built once at import. The checks run cheapest first,
+# so the common rejections never reach the regexes.
+
+ALLOWED_SCHEMES = frozenset(("http", "https"))
+
+ALLOWED_DOMAINS = (
+    ".ics.uci.edu",
+    ".cs.uci.edu",
+    ".informatics.uci.edu",
+    ".stat.uci.edu")
+
+BLOCKED_EXTENSIONS = frozenset((
+    "css", "js", "bmp", "gif", "jpg", "jpeg", "ico",
+    "png", "tif", "tiff", "mid", "mp2", "mp3", "mp4",
+    "wav", "avi", "mov", "mpeg", "ram", "m4v", "mkv", "ogg", "ogv", "pdf",
+    "ps", "eps", "tex", "ppt", "pptx", "doc", "docx", "xls", "xlsx", "names",
+    "data", "dat", "exe", "bz2", "tar", "msi", "bin", "7z", "psd", "dmg", "iso",
+    "epub", "dll", "cnf", "tgz", "sha1",
+    "thmx", "mso", "arff", "rtf", "jar", "csv",
+    "rm", "smil", "wmv", "swf", "wma", "zip", "rar", "gz"))
+
+# calendar pages link to the next day/month forever.
+CALENDAR_PATTERN = re.compile(
+    r"/(?:calendar|events?)/(?:.*/)?(?:day|week|month|list|\d{4}-\d{2})"
+    r"|[?&;](?:ical|outlook-ical|tribe-bar-date|eventdisplay|date|month|year)=",
+    re.IGNORECASE)
+
+# session ids, comment replies, wiki revisions and actions all lead to endless
+# variants of the same page.
+SESSION_QUERY_PATTERN = re.compile(
+    r"(?:^|[&;])(?:sid|sessionid|phpsessid|jsessionid|replytocom|share"
+    r"|do|rev|version|action|difftype)=",
+    re.IGNORECASE)
+
+# scheme, netloc, path and query of a url, split as urlparse splits them
+# (RFC 3986, appendix B) without its generality, which costs more than every
+# rule together.
+URL_PATTERN = re.compile(
+    r"(?:([A-Za-z][A-Za-z0-9+.-]*):)?(?://([^/?#]*))?([^?#]*)(?:\?([^#]*))?")
+
+MAX_PATH_SEGMENTS = 15
+MAX_SEGMENT_REPEATS = 3  # the same path segment this often means a relative link loop
+
+# rule names, as reported by rejection_counts
+SCHEME = "scheme"
+DOMAIN = "domain"
+EXTENSION = "extension"
+CALENDAR = "calendar"
+REPEATED_SEGMENTS = "repeated_segments"
+SESSION_QUERY = "session_query"
+
+_rejections = Counter()
+_counts_lock = Lock()
+
+
+def is_valid(url: str) -> bool:
+    '''Returns True if the url should be crawled.'''
+    rule = rejecting_rule(parse(url))
+    if rule is not None:
+        with _counts_lock:
+            _rejections[rule] += 1
+        return False
+    return True
+
+
+def filter_urls(urls: list[str]) -> list[str]:
+    '''Returns the urls that should be crawled, keeping their order.'''
+    kept = list()
+    rejections = Counter()
+    for url in urls:
+        rule = rejecting_rule(parse(url))
+        if rule is None:
+            kept.append(url)
+        else:
+            rejections[rule] += 1
+    with _counts_lock:
+        _rejections.update(rejections)
+    return kept
+
+
+def rejection_counts() -> dict[str, int]:
+    '''Returns how many urls each rule has rejected so far.'''
+    with _counts_lock:
+        return dict(_rejections)
+
+
+def parse(url: str) -> ParseResult:
+    '''Same as urlparse, without the fragment, which no rule looks at.'''
+    if not url.isprintable() or url.startswith(" "):
+        # urlparse drops whitespace and control characters first.
+        return urlparse(url)._replace(fragment="")
+    scheme, netloc, path, query = URL_PATTERN.match(url).groups()
+    params = ""
+    if ";" in path:
+        # parameters of the last path segment only, as urlparse splits them.
+        i = path.find(";", path.rfind("/"))
+        if i >= 0:
+            path, params = path[:i], path[i + 1:]
+    return ParseResult(
+        scheme.lower() if scheme else "", netloc or "", path, params, query or "", "")
+
+
+def rejecting_rule(parsed: ParseResult) -> str:
+    '''Returns the name of the first rule that rejects the url, or None.'''
+    if parsed.scheme not in ALLOWED_SCHEMES:
+        return SCHEME
+    if not parsed.netloc.endswith(ALLOWED_DOMAINS):
+        return DOMAIN
+
+    path = parsed.path
+    _, dot, extension = path.rpartition(".")
+    if dot and extension.lower() in BLOCKED_EXTENSIONS:
+        return EXTENSION
+
+    segments = path.split("/")
+    if len(segments) > MAX_PATH_SEGMENTS or _has_repeated_segment(segments):
+        return REPEATED_SEGMENTS
+
+    query = parsed.query
+    if parsed.params and SESSION_QUERY_PATTERN.search(parsed.params):
+        return SESSION_QUERY
+    if query and SESSION_QUERY_PATTERN.search(query):
+        return SESSION_QUERY
+    if CALENDAR_PATTERN.search(f"{path}?{query}" if query else path):
+        return CALENDAR
+    return None
+
+
+def _has_repeated_segment(segments: list[str]) -> bool:
+    '''Checks if any non empty path segment shows up MAX_SEGMENT_REPEATS times.'''
+    if len(segments) <= MAX_SEGMENT_REPEATS:
+        return False
+    # no segment at all shows up that often, which is most paths.
+    if len(set(segments)) > len(segments) - MAX_SEGMENT_REPEATS + 1:
+        return False
+    counts = Counter(segments)
+    counts.pop("", None)
+    return any(count >= MAX_SEGMENT_REPEATS for count in counts.values())